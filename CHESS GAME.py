@@ -1,7 +1,13 @@
 import chess
 import tkinter as tk
 from tkinter import messagebox, Menu
-import math
+import os
+
+from book import DEFAULT_BOOK_PATH, OpeningBook
+from engine import Engine, SearchHandle
+from hashfile import DEFAULT_HASH_FILE_PATH, open_hash_file
+from tablebase import DEFAULT_TABLEBASE_PATH
+from instrumentation import InstrumentedEngine, format_report
 
 class ChessGame:
     def __init__(self, root):
@@ -9,19 +15,44 @@ class ChessGame:
         self.root.title("Chess vs AI")
         
         # Game settings
-        self.difficulty = 3  #Default AI depth
+        self.difficulty = 3  #Default AI depth (maximum depth of the iterative deepening)
+        self.time_limit = None #seconds per AI move, None = search to full depth
+        self.node_limit = None #optional cap on searched nodes per AI move
         self.player_color = True  #True = White, False = Black
         self.show_legal_moves = True #shows legal moves for the select chess piece
+        self.show_search_stats = False #measure every AI search and show it in the side panel
+        self.search_log_path = None #file that gets one JSON line per AI move, None = no log
+        
+        # AI search state
+        self.engine = Engine() #search and evaluation, runs without Tk
+        self.search_handle = None #AI search running in the background, None when idle
+        self.search_poll_ms = 50 #how often the UI checks whether the AI has finished
+        self.ponder = False #keep searching the expected reply while the player thinks
+        self.ponder_handle = None #search on the expected position, None when not pondering
+        self.ponder_move = None #the reply the ponder search expects
+        self.book_path = DEFAULT_BOOK_PATH #Polyglot book next to the game, used when it exists
+        if os.path.exists(self.book_path):
+            self.engine.book = OpeningBook(self.book_path)
+        if os.path.isdir(DEFAULT_TABLEBASE_PATH): #Syzygy files next to the game, used when they exist
+            self.engine.tablebase_path = DEFAULT_TABLEBASE_PATH
+        self.hash_file_path = DEFAULT_HASH_FILE_PATH #searches saved on disk (prepopulate.py), used when it exists
+        if os.path.exists(self.hash_file_path):
+            self.use_hash_file(True)
         
         # Game state
         self.board = chess.Board() #creates a fresh chess board with pieces on initial setting,imports from chess library
         self.selected_square = None #to notify the selected square,highligh/legal moves
         self.move_history = [] #side wali list ke liye
+        self.fen_history = [self.board.fen()] #FEN after every ply, [0] = start, for jumping back in the history
+        self.view_ply = None #ply shown while looking at an earlier position, None = the live game
+        self.view_board = None #board of view_ply, built from its FEN
         self.game_in_progress = True #bool flag, game chal raha hai, (not checkmate, draw, or resigned)
         self.last_move = None #track last move(highlights suares,jis point se move kiya hai and jaha pe move kiya hai, none hai kyuki initialize kiya hai)
         
         # UI settings
-        self.square_size = 60 #side of square box (pixels)
+        self.default_square_size = 60
+        self.square_size = self.default_square_size #side of square box (pixels)
+        self.resizable_board = False #board follows the window size
         self.board_size = self.square_size * 8 #board size 8 square per side
         self.light_square_color = "#EEE8AA"
         self.dark_square_color = "#654321"
@@ -54,12 +85,21 @@ class ChessGame:
         )
         self.status_label.pack(pady=10)
         
+        # Search statistics, only packed while they are switched on
+        self.stats_label = tk.Label(
+            self.side_panel,
+            text="",
+            font=("Arial", 9),
+            justify=tk.LEFT
+        )
+        
         # Move history
         history_frame = tk.LabelFrame(self.side_panel, text="Move History")
         history_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
-        self.history_text = tk.Text(history_frame, width=15, height=15)
+        self.history_text = tk.Text(history_frame, width=15, height=15, cursor="arrow")
         self.history_text.pack(padx=5, pady=5, fill=tk.BOTH, expand=True)
+        self.history_text.tag_configure("viewed", background=self.move_highlight_color) #move whose position is shown
         
         # Control buttons
         button_frame = tk.Frame(self.side_panel)
@@ -89,15 +129,19 @@ class ChessGame:
         }
         
         # Bind events
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_game) #closing the window also stops the AI
         self.canvas.bind("<Button-1>", self.on_square_click) #every left-click(button-1 indicates left click) on the board into a chess-board action: selecting your piece, highlighting it, showing its legal moves, and then—on the second click—actually moving it.
         
         # Initialize the board display
+        self.create_board_items()
+        self.canvas.bind("<Configure>", self.on_canvas_resize)
         self.draw_board() #calling drawboard
         
         # Start the game
         if not self.player_color: #if not white color
             self.root.after(100, self.make_ai_move) #after 0.1 sec ai moves first
     
+    
     def create_menu(self):
         menubar = Menu(self.root) #initailizes menu wala bar
         
@@ -105,7 +149,7 @@ class ChessGame:
         file_menu = Menu(menubar, tearoff=0) #menu => dropdown submenu , tearoff=> disables floating window(to avoid pop out window)
         file_menu.add_command(label="New Game", command=self.new_game)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.exit_game)
         menubar.add_cascade(label="File", menu=file_menu)
         
         # Settings menu
@@ -120,6 +164,18 @@ class ChessGame:
                 value=level,
                 command=lambda l=level: self.set_difficulty(l)
             )
+        
+        # Time budget per move, the search stops at the level above or when time runs out
+        difficulty_menu.add_separator()
+        self.time_limit_var = tk.DoubleVar(value=self.time_limit or 0)
+        for seconds, label in [(0, "No Time Limit"), (1, "1 Second per Move"), (3, "3 Seconds per Move"),
+                               (5, "5 Seconds per Move"), (10, "10 Seconds per Move")]:
+            difficulty_menu.add_radiobutton(
+                label=label,
+                variable=self.time_limit_var,
+                value=seconds,
+                command=lambda s=seconds: self.set_time_limit(s)
+            )
         settings_menu.add_cascade(label="AI Difficulty", menu=difficulty_menu)
         
         # Player color submenu
@@ -134,6 +190,53 @@ class ChessGame:
         )
         settings_menu.add_cascade(label="Player Color", menu=color_menu)
         
+        # Number of processes the AI searches with
+        cpu_count = os.cpu_count() or 1
+        workers_menu = Menu(settings_menu, tearoff=0)
+        self.workers_var = tk.IntVar(value=self.engine.workers)
+        for count in sorted({1, 2, 4, 8, cpu_count}):
+            if count > cpu_count:
+                continue
+            workers_menu.add_radiobutton(
+                label="1 Process" if count == 1 else f"{count} Processes",
+                variable=self.workers_var,
+                value=count,
+                command=lambda c=count: self.set_workers(c)
+            )
+        settings_menu.add_cascade(label="AI Processes", menu=workers_menu)
+        
+        # Search on the player's time
+        settings_menu.add_checkbutton(
+            label="Think on Your Time (Ponder)",
+            variable=tk.BooleanVar(value=self.ponder),
+            command=self.toggle_ponder
+        )
+        
+        # Opening book, only offered when the book file is there
+        settings_menu.add_checkbutton(
+            label="Use Opening Book",
+            variable=tk.BooleanVar(value=self.engine.book is not None),
+            command=self.toggle_opening_book,
+            state=tk.NORMAL if os.path.exists(self.book_path) else tk.DISABLED
+        )
+        settings_menu.add_checkbutton(
+            label="Use Endgame Tablebases",
+            variable=tk.BooleanVar(value=self.engine.tablebase_path is not None),
+            command=self.toggle_tablebases,
+            state=tk.NORMAL if os.path.isdir(DEFAULT_TABLEBASE_PATH) else tk.DISABLED
+        )
+        settings_menu.add_checkbutton(
+            label="Remember Searches on Disk",
+            variable=tk.BooleanVar(value=self.engine.hash_file_path is not None),
+            command=lambda: self.use_hash_file(self.engine.hash_file_path is None)
+        )
+        
+        settings_menu.add_checkbutton(
+            label="Resizable Board",
+            variable=tk.BooleanVar(value=self.resizable_board),
+            command=self.toggle_resizable_board
+        )
+        
         # Legal moves option
         settings_menu.add_checkbutton( #checkbutton => use for creating checkbox
             label="Don't Show Legal Moves", 
@@ -141,10 +244,24 @@ class ChessGame:
             command=lambda: self.toggle_show_legal_moves()
         )
         
+        # Search statistics options
+        settings_menu.add_separator()
+        settings_menu.add_checkbutton(
+            label="Show Search Statistics",
+            variable=tk.BooleanVar(value=self.show_search_stats),
+            command=self.toggle_search_stats
+        )
+        settings_menu.add_checkbutton(
+            label="Log Search Statistics to File",
+            variable=tk.BooleanVar(value=self.search_log_path is not None),
+            command=self.toggle_search_log
+        )
+        
         menubar.add_cascade(label="Settings", menu=settings_menu)
         
         # Help menu
         help_menu = Menu(menubar, tearoff=0)
+        help_menu.add_command(label="AI Statistics", command=self.show_ai_stats)
         help_menu.add_command(label="About", command=self.show_about)
         menubar.add_cascade(label="Help", menu=help_menu)
         
@@ -153,6 +270,12 @@ class ChessGame:
     def set_difficulty(self, level): #set difficulty wala func
         self.difficulty = level
     
+    def set_time_limit(self, seconds): #0 means no time limit
+        self.time_limit = seconds if seconds > 0 else None
+    
+    def set_workers(self, count):
+        self.engine.workers = count #the pool is rebuilt with the new size on the next AI move
+    
     def set_player_color(self, is_white): #color change karne ke liye
         # Only allow color change during a new game
         if len(self.move_history) > 0: #checks condition, agar gameshuru ho gay toh color change nahi hoga
@@ -160,6 +283,7 @@ class ChessGame:
             return
         
         self.player_color = is_white
+        self.cancel_ai_move() #AI may already be thinking about the first move for the old color
         
         # If switching to black and it's a new game, make AI move
         if not is_white and len(self.move_history) == 0:
@@ -169,129 +293,210 @@ class ChessGame:
         self.show_legal_moves = not self.show_legal_moves
         self.draw_board()
     
-    def draw_board(self):
-        self.canvas.delete("all")
-        
-        # Draw square backgrounds
-        for row in range(8):
-            for col in range(8):
-                x1 = col * self.square_size
-                y1 = row * self.square_size
-                x2 = x1 + self.square_size
-                y2 = y1 + self.square_size
-                
-                # Determine square color
-                color = self.light_square_color if (row + col) % 2 == 0 else self.dark_square_color
-                
-                # Highlight selected square
-                if self.selected_square is not None:
-                    sel_col = chess.square_file(self.selected_square)
-                    sel_row = 7 - chess.square_rank(self.selected_square)
-                    if row == sel_row and col == sel_col: #If you’ve clicked a piece, override that square’s color with selected_color
-                        color = self.selected_color 
-                
-                # Draw the square
-                self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="") #square boxes filled with color without border
+    def toggle_ponder(self):
+        self.ponder = not self.ponder
+        if not self.ponder:
+            self.stop_pondering()
+    
+    def toggle_opening_book(self):
+        if self.engine.book is not None:
+            self.engine.book.close()
+            self.engine.book = None
+        else:
+            self.engine.book = OpeningBook(self.book_path)
+    
+    def toggle_tablebases(self):
+        self.engine.tablebase_path = None if self.engine.tablebase_path else DEFAULT_TABLEBASE_PATH
+    
+    def use_hash_file(self, enabled):
+        # The file is created on first use; its results are copied into the table so even the
+        # first AI move starts warm
+        if not enabled:
+            self.engine.hash_file_path = None
+            return
+        try:
+            open_hash_file(self.hash_file_path, self.engine.hash_file_key()).warm(self.engine.tt)
+        except (OSError, ValueError) as error:
+            messagebox.showerror("Search File", f"Can't use {self.hash_file_path}: {error}")
+            return
+        self.engine.hash_file_path = self.hash_file_path
+    
+    def toggle_search_stats(self):
+        self.show_search_stats = not self.show_search_stats
+        if self.show_search_stats:
+            self.stats_label.pack(after=self.status_label, pady=5)
+        else:
+            self.stats_label.pack_forget()
+    
+    def toggle_search_log(self):
+        self.search_log_path = None if self.search_log_path else "search_stats.log"
+    
+    def update_engine_class(self):
+        # Measured engine only while somebody looks at the numbers, the plain one has no overhead
+        instrumented = self.show_search_stats or self.search_log_path is not None
+        if instrumented:
+            if not isinstance(self.engine, InstrumentedEngine):
+                self.engine = InstrumentedEngine.from_engine(self.engine)
+            self.engine.log_path = self.search_log_path
+        elif isinstance(self.engine, InstrumentedEngine):
+            plain = Engine.__new__(Engine)
+            plain.__dict__.update(self.engine.__dict__)
+            self.engine = plain
+    
+    def update_stats_panel(self):
+        report = getattr(self.engine, "last_report", None)
+        if self.show_search_stats and report is not None:
+            self.stats_label.config(text=format_report(report))
+    
+    def create_board_items(self):
+        # Every canvas item is created once here and tagged with its square; draw_board only
+        # changes the items whose look changed, so a click never rebuilds the whole board
+        canvas = self.canvas
+        self.square_items = []
+        self.hint_items = []
+        self.frame_items = []
+        self.piece_items = []
+        self.label_items = []
+        
+        # Creation order is the stacking order: squares, labels, move hints, outlines, pieces
+        for square in chess.SQUARES:
+            self.square_items.append(canvas.create_rectangle(
+                0, 0, 0, 0, fill=self.square_color(square), outline="", tags=("square", f"sq{square}")
+            ))
+        for i in range(8):
+            rank_color = self.dark_square_color if i % 2 == 0 else self.light_square_color
+            self.label_items.append(canvas.create_text(0, 0, text=str(8-i), fill=rank_color, tags="label"))
+            file_color = self.dark_square_color if (7 + i) % 2 == 0 else self.light_square_color
+            self.label_items.append(canvas.create_text(0, 0, text=chr(97+i), fill=file_color, tags="label"))
+        for square in chess.SQUARES:
+            self.hint_items.append(canvas.create_oval(0, 0, 0, 0, state=tk.HIDDEN, tags=("hint", f"sq{square}")))
+        for square in chess.SQUARES:
+            self.frame_items.append(canvas.create_rectangle(
+                0, 0, 0, 0, fill="", outline="", width=3, tags=("frame", f"sq{square}")
+            ))
+        for square in chess.SQUARES:
+            self.piece_items.append(canvas.create_text(0, 0, text="", fill="black", tags=("piece", f"sq{square}")))
         
-        # Draw rank and file labels
+        self.drawn = [(self.square_color(square), "", None, "") for square in chess.SQUARES] #what every square shows now
+        self.place_board_items()
+    
+    def square_color(self, square):
+        row = 7 - chess.square_rank(square)
+        col = chess.square_file(square)
+        return self.light_square_color if (row + col) % 2 == 0 else self.dark_square_color
+    
+    def place_board_items(self):
+        # Coordinates and fonts for the current square_size. Only needed when the board size
+        # changes, and always the same number of items whatever the position
+        size = self.square_size
+        for square in chess.SQUARES:
+            x1 = chess.square_file(square) * size
+            y1 = (7 - chess.square_rank(square)) * size
+            self.canvas.coords(self.square_items[square], x1, y1, x1 + size, y1 + size)
+            self.canvas.coords(self.frame_items[square], x1, y1, x1 + size, y1 + size)
+            self.canvas.coords(self.piece_items[square], x1 + size // 2, y1 + size // 2)
+            self.canvas.itemconfig(self.piece_items[square], font=("Arial", size * 3 // 5))
+            self.place_hint(square, self.drawn[square][2])
+        
+        label_font = ("Arial", max(6, size // 6))
         for i in range(8):
-            # Rank labels (1-8)
-            x = 5 #used as padding
-            y = i * self.square_size + self.square_size // 2
-            color = self.dark_square_color if i % 2 == 0 else self.light_square_color
-            self.canvas.create_text(x, y, text=str(8-i), fill=color, font=("Arial", 10))
-         
-            # File labels (a-h)
-            x = i * self.square_size + self.square_size // 2
-            y = self.board_size - 5
-            color = self.dark_square_color if (7 + i) % 2 == 0 else self.light_square_color
-            self.canvas.create_text(x, y, text=chr(97+i), fill=color, font=("Arial", 10))
-        
-        # Highlight legal moves for selected piece
-        if self.selected_square is not None and self.show_legal_moves:
-            self.highlight_legal_moves()
-        
-        # Highlight last move
-        if self.last_move:
-            for square in [self.last_move.from_square, self.last_move.to_square]:
-                col = chess.square_file(square)
-                row = 7 - chess.square_rank(square)
-                x1 = col * self.square_size
-                y1 = row * self.square_size
-                x2 = x1 + self.square_size
-                y2 = y1 + self.square_size
-                self.canvas.create_rectangle(
-                    x1, y1, x2, y2, 
-                    fill="", 
-                    outline=self.last_move_color,
-                    width=3
-                )
-        
-        # Highlight king in check
-        if self.board.is_check():
-            king_square = self.board.king(self.board.turn)
-            col = chess.square_file(king_square)
-            row = 7 - chess.square_rank(king_square)
-            x1 = col * self.square_size
-            y1 = row * self.square_size
-            x2 = x1 + self.square_size
-            y2 = y1 + self.square_size
-            self.canvas.create_rectangle(
-                x1, y1, x2, y2, 
-                fill="", 
-                outline=self.check_color,
-                width=3
-            )
+            self.canvas.coords(self.label_items[2 * i], 5, i * size + size // 2) #rank labels (1-8), 5 = padding
+            self.canvas.coords(self.label_items[2 * i + 1], i * size + size // 2, self.board_size - 5) #file labels (a-h)
+            self.canvas.itemconfig(self.label_items[2 * i], font=label_font)
+            self.canvas.itemconfig(self.label_items[2 * i + 1], font=label_font)
+    
+    def place_hint(self, square, hint):
+        # Captures get a circle outline, empty squares a dot
+        size = self.square_size
+        x = chess.square_file(square) * size + size // 2
+        y = (7 - chess.square_rank(square)) * size + size // 2
+        r = size // 2 - 4 if hint == "capture" else size // 6
+        self.canvas.coords(self.hint_items[square], x - r, y - r, x + r, y + r)
+    
+    def draw_board(self):
+        # Work out what every square should show and touch only the items that differ
+        if self.view_board is not None: #earlier position from the move history
+            board = self.view_board
+            last_move = self.move_history[self.view_ply - 1] if self.view_ply > 0 else None
+        else:
+            board = self.board
+            last_move = self.last_move
+        hints = self.legal_move_hints() if self.selected_square is not None and self.show_legal_moves else {}
+        check_square = board.king(board.turn) if board.is_check() else None
+        last_squares = (last_move.from_square, last_move.to_square) if last_move else ()
         
-        # Draw pieces
-        for row in range(8):
-            for col in range(8):
-                square = chess.square(col, 7 - row)
-                piece = self.board.piece_at(square)
-                if piece:
-                    x = col * self.square_size + self.square_size // 2
-                    y = row * self.square_size + self.square_size // 2
-                    piece_symbol = self.piece_unicode[piece.symbol()]
-                    self.canvas.create_text(
-                        x, y, 
-                        text=piece_symbol, 
-                        font=("Arial", 36),
-                        fill="black" if piece.color == chess.WHITE else "black"
-                    )
+        for square in chess.SQUARES:
+            fill = self.selected_color if square == self.selected_square else self.square_color(square)
+            if square == check_square:
+                frame = self.check_color
+            elif square in last_squares:
+                frame = self.last_move_color
+            else:
+                frame = ""
+            piece = board.piece_at(square)
+            state = (fill, frame, hints.get(square), self.piece_unicode[piece.symbol()] if piece else "")
+            if state != self.drawn[square]:
+                self.update_square(square, state)
         
         # Update status
         self.update_status()
     
-    def highlight_legal_moves(self):
+    def update_square(self, square, state):
+        fill, frame, hint, text = state
+        old_fill, old_frame, old_hint, old_text = self.drawn[square]
+        if fill != old_fill:
+            self.canvas.itemconfig(self.square_items[square], fill=fill)
+        if frame != old_frame:
+            self.canvas.itemconfig(self.frame_items[square], outline=frame)
+        if hint != old_hint:
+            if hint is None:
+                self.canvas.itemconfig(self.hint_items[square], state=tk.HIDDEN)
+            else:
+                self.place_hint(square, hint)
+                if hint == "capture":
+                    self.canvas.itemconfig(self.hint_items[square], state=tk.NORMAL, fill="", outline=self.move_highlight_color, width=3)
+                else:
+                    self.canvas.itemconfig(self.hint_items[square], state=tk.NORMAL, fill=self.move_highlight_color, outline="", width=1)
+        if text != old_text:
+            self.canvas.itemconfig(self.piece_items[square], text=text)
+        self.drawn[square] = state
+    
+    def legal_move_hints(self):
+        # Target square -> "capture" or "move" for the legal moves of the selected piece
+        hints = {}
         for move in self.board.legal_moves:
             if move.from_square == self.selected_square:
-                to_square = move.to_square
-                col = chess.square_file(to_square)
-                row = 7 - chess.square_rank(to_square)
-                x = col * self.square_size + self.square_size // 2
-                y = row * self.square_size + self.square_size // 2
-                
-                # Check if square has an opponent's piece
-                has_piece = self.board.piece_at(to_square) is not None
-                
-                if has_piece:
-                    # Highlight captures with a circle outline
-                    r = self.square_size // 2 - 4
-                    self.canvas.create_oval(
-                        x - r, y - r, x + r, y + r,
-                        outline=self.move_highlight_color,
-                        width=3
-                    )
-                else:
-                    # Highlight empty squares with a dot
-                    r = self.square_size // 6
-                    self.canvas.create_oval(
-                        x - r, y - r, x + r, y + r,
-                        fill=self.move_highlight_color,
-                        outline=""
-                    )
+                hints[move.to_square] = "capture" if self.board.piece_at(move.to_square) is not None else "move"
+        return hints
+    
+    def toggle_resizable_board(self):
+        self.resizable_board = not self.resizable_board
+        if self.resizable_board:
+            self.main_frame.pack_configure(fill=tk.BOTH, expand=True)
+            self.canvas.pack_configure(fill=tk.BOTH, expand=True)
+        else:
+            self.main_frame.pack_configure(fill=tk.NONE, expand=False)
+            self.canvas.pack_configure(fill=tk.NONE, expand=False)
+            self.resize_board(self.default_square_size)
+            self.canvas.config(width=self.board_size, height=self.board_size)
+    
+    def on_canvas_resize(self, event):
+        if self.resizable_board:
+            self.resize_board(min(event.width, event.height) // 8)
+    
+    def resize_board(self, square_size):
+        square_size = max(square_size, 20)
+        if square_size != self.square_size:
+            self.square_size = square_size
+            self.board_size = square_size * 8
+            self.place_board_items()
     
     def on_square_click(self, event): #galti se click hone par check karne ke liye, if hamari move hogi toh piece select hoga and if computer ki turn hogi toh kuch nahi hoga hamare click se
+        # A click on the board while looking at an earlier position goes back to the game
+        if self.view_board is not None:
+            self.show_live_position()
+            return
+        
         if not self.game_in_progress or (self.board.turn != chess.WHITE) != (not self.player_color):
             return
         
@@ -341,12 +546,18 @@ class ChessGame:
     
     def make_move(self, move):
         # Make the move
+        san = self.board.san(move) #needs the position before the move
         self.board.push(move)
         self.move_history.append(move)
+        self.fen_history.append(self.board.fen())
         self.last_move = move
         
+        # A new move always shows the live game again
+        if self.view_board is not None:
+            self.show_live_position(redraw=False)
+        
         # Update move history display
-        self.update_move_display()
+        self.append_move_display(san)
         
         # Check for game over
         if self.board.is_game_over():
@@ -356,23 +567,46 @@ class ChessGame:
         # Redraw the board
         self.draw_board()
     
-    def update_move_display(self):
-        if not self.move_history:
-            return
-        
-        self.history_text.delete(1.0, tk.END)
-        
-        move_pairs = []
-        for i in range(0, len(self.move_history), 2):
-            move_str = f"{i//2 + 1}. {self.move_history[i].uci()}"
-            if i + 1 < len(self.move_history):
-                move_str += f" {self.move_history[i+1].uci()}"
-            move_pairs.append(move_str)
+    def append_move_display(self, san):
+        # Adds just the new move: a numbered new line for white, the same line for black
+        ply = len(self.move_history) - 1
+        if ply % 2 == 0:
+            prefix = f"{ply//2 + 1}. " if ply == 0 else f"\n{ply//2 + 1}. "
+            self.history_text.insert(tk.END, prefix)
+        else:
+            self.history_text.insert(tk.END, " ")
         
-        self.history_text.insert(tk.END, "\n".join(move_pairs)) #each move is stored on next line
+        # Every move is its own tag, clicking it shows the position after that move
+        tag = f"ply{ply + 1}"
+        self.history_text.insert(tk.END, san, tag)
+        self.history_text.tag_bind(tag, "<Button-1>", lambda event, p=ply + 1: self.show_position(p))
         self.history_text.see(tk.END) #auto scrolls and shows the last move
     
+    def show_position(self, ply):
+        # Board from the FEN snapshot, no replaying of the moves before it
+        if ply == len(self.move_history):
+            self.show_live_position()
+            return
+        self.view_ply = ply
+        self.view_board = chess.Board(self.fen_history[ply])
+        self.selected_square = None
+        self.history_text.tag_remove("viewed", "1.0", tk.END)
+        self.history_text.tag_add("viewed", f"ply{ply}.first", f"ply{ply}.last")
+        self.draw_board()
+    
+    def show_live_position(self, redraw=True):
+        self.view_ply = None
+        self.view_board = None
+        self.history_text.tag_remove("viewed", "1.0", tk.END)
+        if not self.game_in_progress:
+            self.status_label.config(text="Game over")
+        if redraw:
+            self.draw_board()
+    
     def update_status(self):
+        if self.view_board is not None:
+            self.status_label.config(text=f"Viewing move {(self.view_ply + 1) // 2} - click the board to return")
+            return
         if not self.game_in_progress:
             return
         
@@ -389,187 +623,93 @@ class ChessGame:
         self.status_label.config(text=status)
     
     def make_ai_move(self):
-        if not self.game_in_progress:
+        if not self.game_in_progress or self.search_handle is not None:
+            return
+        
+        # Move may have been scheduled before a new game or a color change
+        if (self.board.turn == chess.WHITE) == self.player_color:
+            return
+        
+        # Ponder hit: the search on this position is already running, it just gets the clock now
+        if self.ponder_handle is not None:
+            if self.board.move_stack and self.board.move_stack[-1] == self.ponder_move:
+                handle = self.ponder_handle
+                self.ponder_handle = None
+                self.ponder_move = None
+                self.engine.ponderhit()
+                self.status_label.config(text="AI is thinking...")
+                self.search_handle = handle
+                self.root.after(self.search_poll_ms, self.poll_ai_move, handle)
+                return
+            self.stop_pondering() #ponder miss, throw that search away
+        
+        # Known opening line: play the book move, no search needed
+        book_move = self.engine.book_move(self.board)
+        if book_move:
+            self.make_move(book_move)
             return
         
         # Start thinking animation
         self.status_label.config(text="AI is thinking...")
-        self.root.update_idletasks() #process any pending UI updates, gives time to think for ai
         
-        # Calculate best move
-        _, best_move = self.minimax(
-            self.board, 
-            self.difficulty, 
-            -math.inf, 
-            math.inf, 
-            self.board.turn == chess.WHITE
-        )
+        self.update_engine_class()
         
-        if best_move:
-            self.make_move(best_move)
+        # Search on a worker thread, the board copy keeps the UI board untouched
+        handle = SearchHandle(self.find_best_move, self.board.copy())
+        self.search_handle = handle
+        self.root.after(self.search_poll_ms, self.poll_ai_move, handle)
     
-    def minimax(self, board, depth, alpha, beta, is_maximizing):
-        # Return evaluation if we've reached max depth or game over
-        if depth == 0 or board.is_game_over():
-            return self.evaluate_position(board), None
-        
-        best_move = None
+    def poll_ai_move(self, handle):
+        if handle is not self.search_handle:
+            return #search was cancelled (new game, resign, exit)
         
-        if is_maximizing:
-            max_eval = -math.inf
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score, _ = self.minimax(board, depth - 1, alpha, beta, False)
-                board.pop()
-                
-                if eval_score > max_eval:
-                    max_eval = eval_score
-                    best_move = move
-                
-                alpha = max(alpha, eval_score)
-                if beta <= alpha:
-                    break
-                    
-            return max_eval, best_move
-        else:
-            min_eval = math.inf
-            for move in board.legal_moves:
-                board.push(move)
-                eval_score, _ = self.minimax(board, depth - 1, alpha, beta, True)
-                board.pop()
-                
-                if eval_score < min_eval:
-                    min_eval = eval_score
-                    best_move = move
-                
-                beta = min(beta, eval_score)
-                if beta <= alpha:
-                    break
-                    
-            return min_eval, best_move
-    
-    # Basic piece values
-    piece_values = {
-        chess.PAWN: 100,
-        chess.KNIGHT: 320,
-        chess.BISHOP: 330,
-        chess.ROOK: 500,
-        chess.QUEEN: 900,
-        chess.KING: 20000
-    }
-    
-    # Piece-square tables for position evaluation
-    pawn_table = [
-        0,  0,  0,  0,  0,  0,  0,  0,
-        50, 50, 50, 50, 50, 50, 50, 50,
-        10, 10, 20, 30, 30, 20, 10, 10,
-        5,  5, 10, 25, 25, 10,  5,  5,
-        0,  0,  0, 20, 20,  0,  0,  0,
-        5, -5,-10,  0,  0,-10, -5,  5,
-        5, 10, 10,-20,-20, 10, 10,  5,
-        0,  0,  0,  0,  0,  0,  0,  0
-    ]
-    
-    knight_table = [
-        -50,-40,-30,-30,-30,-30,-40,-50,
-        -40,-20,  0,  0,  0,  0,-20,-40,
-        -30,  0, 10, 15, 15, 10,  0,-30,
-        -30,  5, 15, 20, 20, 15,  5,-30,
-        -30,  0, 15, 20, 20, 15,  0,-30,
-        -30,  5, 10, 15, 15, 10,  5,-30,
-        -40,-20,  0,  5,  5,  0,-20,-40,
-        -50,-40,-30,-30,-30,-30,-40,-50
-    ]
-    
-    bishop_table = [
-        -20,-10,-10,-10,-10,-10,-10,-20,
-        -10,  0,  0,  0,  0,  0,  0,-10,
-        -10,  0, 10, 10, 10, 10,  0,-10,
-        -10,  5,  5, 10, 10,  5,  5,-10,
-        -10,  0,  5, 10, 10,  5,  0,-10,
-        -10,  5,  5,  5,  5,  5,  5,-10,
-        -10,  0,  5,  0,  0,  5,  0,-10,
-        -20,-10,-10,-10,-10,-10,-10,-20
-    ]
-    
-    rook_table = [
-        0,  0,  0,  0,  0,  0,  0,  0,
-        5, 10, 10, 10, 10, 10, 10,  5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        0,  0,  0,  5,  5,  0,  0,  0
-    ]
-    
-    queen_table = [
-        -20,-10,-10, -5, -5,-10,-10,-20,
-        -10,  0,  0,  0,  0,  0,  0,-10,
-        -10,  0,  5,  5,  5,  5,  0,-10,
-        -5,  0,  5,  5,  5,  5,  0, -5,
-        0,  0,  5,  5,  5,  5,  0, -5,
-        -10,  5,  5,  5,  5,  5,  0,-10,
-        -10,  0,  5,  0,  0,  0,  0,-10,
-        -20,-10,-10, -5, -5,-10,-10,-20
-    ]
-    
-    king_table = [
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -20,-30,-30,-40,-40,-30,-30,-20,
-        -10,-20,-20,-20,-20,-20,-20,-10,
-        20, 20,  0,  0,  0,  0, 20, 20,
-        20, 30, 10,  0,  0, 10, 30, 20
-    ]
-    
-    piece_tables = {
-        chess.PAWN: pawn_table,
-        chess.KNIGHT: knight_table,
-        chess.BISHOP: bishop_table,
-        chess.ROOK: rook_table,
-        chess.QUEEN: queen_table,
-        chess.KING: king_table
-    }
-    
-    def evaluate_position(self, board):
-        if board.is_checkmate():
-            # Return a large negative value if the side to move is checkmated
-            return -10000 if board.turn == chess.WHITE else 10000
-            
-        if board.is_stalemate() or board.is_insufficient_material():
-            return 0
-        
-        # Material and position evaluation
-        value = 0
-        
-        # Count material and position value
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece:
-                # Basic piece value
-                piece_value = self.piece_values.get(piece.piece_type, 0)
-                
-                # Position value from piece-square tables
-                position_value = 0
-                piece_table = self.piece_tables.get(piece.piece_type)
-                if piece_table:
-                    # Get the square index (0-63) for the table lookup
-                    # Flip the table for black pieces
-                    square_idx = square
-                    if piece.color == chess.BLACK:
-                        square_idx = chess.square_mirror(square)
-                    position_value = piece_table[square_idx]
-                
-                # Add to total evaluation (positive for white, negative for black)
-                if piece.color == chess.WHITE:
-                    value += piece_value + position_value
-                else:
-                    value -= piece_value + position_value
+        if not handle.done():
+            self.root.after(self.search_poll_ms, self.poll_ai_move, handle)
+            return
         
-        return value
+        self.search_handle = None
+        best_move = handle.result()
+        self.update_stats_panel()
+        if best_move:
+            self.make_move(best_move)
+            self.start_pondering()
+    
+    def start_pondering(self):
+        # Search the position after the reply the principal variation expects, on the player's time
+        if not self.ponder or not self.game_in_progress:
+            return
+        pv = self.engine.principal_variation
+        if len(pv) < 2 or pv[0] != self.board.move_stack[-1] or pv[1] not in self.board.legal_moves:
+            return
+        board = self.board.copy()
+        board.push(pv[1])
+        self.ponder_move = pv[1]
+        self.engine.start_pondering(self.time_limit)
+        self.ponder_handle = SearchHandle(self.find_best_move, board)
+    
+    def stop_pondering(self):
+        if self.ponder_handle is not None:
+            self.ponder_handle.cancel() #the transposition table keeps what it found
+            self.ponder_handle = None
+            self.ponder_move = None
+    
+    def cancel_ai_move(self):
+        self.stop_pondering()
+        if self.search_handle is not None:
+            self.search_handle.cancel()
+            self.search_handle = None
+    
+    def find_best_move(self, board, stop_event):
+        # Runs on the worker thread, must not touch any Tk widget
+        # Calculate best move
+        _, best_move = self.engine.search(
+            board,
+            self.difficulty,
+            self.time_limit,
+            self.node_limit,
+            stop_event
+        )
+        return best_move
     
     def show_result(self):
         result = self.board.result()
@@ -594,12 +734,18 @@ class ChessGame:
         messagebox.showinfo("Game Over", message)
     
     def new_game(self):
+        # Stop the AI if it is still thinking about the old game
+        self.cancel_ai_move()
+        
         # Reset the board
         self.board = chess.Board()
         
         # Reset game state
         self.selected_square = None
         self.move_history = []
+        self.fen_history = [self.board.fen()]
+        self.view_ply = None
+        self.view_board = None
         self.last_move = None
         self.game_in_progress = True
         
@@ -619,9 +765,35 @@ class ChessGame:
             
         answer = messagebox.askyesno("Resign", "Are you sure you want to resign?")
         if answer:
+            self.cancel_ai_move()
             self.game_in_progress = False
             messagebox.showinfo("Game Over", "You resigned. Your opponent wins!")
     
+    def show_ai_stats(self):
+        stats = self.engine.tt.stats()
+        search = self.engine.search_stats()
+        messagebox.showinfo(
+            "AI Statistics",
+            "Last search\n\n"
+            f"Depth: {search['depth']}\n"
+            f"Nodes: {search['nodes']}\n"
+            f"Cutoffs: {search['cutoffs']}\n"
+            f"First-move cutoff rate: {search['first_move_cutoff_rate']:.1%}\n\n"
+            "Transposition table\n\n"
+            f"Hits: {stats['hits']}\n"
+            f"Misses: {stats['misses']}\n"
+            f"Collisions: {stats['collisions']}\n"
+            f"Hit rate: {stats['hit_rate']:.1%}\n"
+            f"Entries used: {stats['filled']} / {stats['capacity']}"
+        )
+    
+    def exit_game(self):
+        self.cancel_ai_move()
+        self.engine.shutdown_search_pool()
+        if self.engine.book is not None:
+            self.engine.book.close()
+        self.root.destroy()
+    
     def show_about(self):
         messagebox.showinfo(
             "About",
@@ -631,6 +803,7 @@ class ChessGame:
         )
 
 
+
 if __name__ == "__main__":
     root = tk.Tk()
     game = ChessGame(root)
@@ -0,0 +1,160 @@
+import argparse
+import collections
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.pgn
+
+from engine import Engine
+
+# Batch analysis of PGN archives: every position of every game gets an engine evaluation,
+# written as [%eval] comments (PGN) or as one JSON line per game.
+#   python analyze.py games.pgn -o annotated.pgn --depth 3 --workers 4
+#   python analyze.py games.pgn -o evals.jsonl --format jsonl --time 0.5
+# Games are read one at a time and only a few are in flight, so memory stays the same for any
+# file size. After every written game the input offset goes to <output>.offset; run the same
+# command again after an interruption and it continues behind the last written game.
+
+IN_FLIGHT_PER_WORKER = 2 #games queued per worker process, bounds memory and keeps the workers busy
+
+_analysis_engine = None #one engine per worker process, its table carries over between positions
+
+def _init_analysis_worker():
+    global _analysis_engine
+    _analysis_engine = Engine()
+
+def analyze_game(fen, moves, depth, time_limit):
+    # Runs in a worker process: (score, mate, best move) for the position after every move
+    engine = _analysis_engine
+    board = chess.Board(fen)
+    evals = []
+    for uci in moves:
+        board.push_uci(uci)
+        if board.is_game_over():
+            evals.append(None) #nothing to evaluate, the result says it all
+            continue
+        score, best_move = engine.search(board, depth, time_limit)
+        mate = None
+        if abs(score) >= 10000:
+            # The principal variation ends in the mate, its length gives the distance
+            mate = (len(engine.principal_variation) + 1) // 2
+            mate = mate if score > 0 else -mate
+        evals.append((int(score), mate, best_move.uci() if best_move else None))
+    return evals
+
+def format_eval(score, mate):
+    # [%eval] value: pawns from white's point of view, or #N / #-N for a mate in N
+    if mate is not None:
+        return f"#{mate}"
+    return f"{score / 100:.2f}"
+
+def annotate_pgn(game, evals):
+    node = game
+    for evaluation in evals:
+        node = node.variations[0]
+        if evaluation is not None:
+            score, mate, _ = evaluation
+            tag = f"[%eval {format_eval(score, mate)}]"
+            node.comment = f"{tag} {node.comment}" if node.comment else tag
+    return str(game) + "\n\n"
+
+def annotate_json(game, evals, offset):
+    board = game.board()
+    plies = []
+    for move, evaluation in zip(game.mainline_moves(), evals):
+        san = board.san(move)
+        board.push(move)
+        entry = {"ply": len(plies) + 1, "move": san}
+        if evaluation is not None:
+            score, mate, best_move = evaluation
+            entry.update({"score": score, "mate": mate, "best": best_move})
+        plies.append(entry)
+    return json.dumps({"offset": offset, "headers": dict(game.headers), "evals": plies}) + "\n"
+
+def read_offset(path):
+    try:
+        with open(path) as offset_file:
+            return json.load(offset_file)
+    except (OSError, ValueError):
+        return None
+
+def write_offset(path, state):
+    # Written to a temporary file first, so an interruption never leaves half a state behind
+    with open(path + ".tmp", "w") as offset_file:
+        json.dump(state, offset_file)
+    os.replace(path + ".tmp", path)
+
+def games_with_offsets(pgn_file):
+    # (offset of the game, offset behind it, game), one game at a time
+    while True:
+        offset = pgn_file.tell()
+        game = chess.pgn.read_game(pgn_file)
+        if game is None:
+            return
+        yield offset, pgn_file.tell(), game
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Annotate PGN files with engine evaluations")
+    parser.add_argument("pgn", help="PGN file to analyze")
+    parser.add_argument("-o", "--output", required=True, help="annotated PGN or JSONL file (appended to on resume)")
+    parser.add_argument("--format", choices=["pgn", "jsonl"], default="pgn")
+    parser.add_argument("--depth", type=int, default=3, help="search depth per position")
+    parser.add_argument("--time", type=float, help="seconds per position (the depth is still the limit)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="analysis processes")
+    parser.add_argument("--max-games", type=int, help="stop after this many games")
+    parser.add_argument("--restart", action="store_true", help="ignore a saved offset and start from the beginning")
+    args = parser.parse_args(argv)
+
+    offset_path = args.output + ".offset"
+    state = None if args.restart else read_offset(offset_path)
+    if state is not None and state.get("pgn") != os.path.abspath(args.pgn):
+        state = None #offset of another input file
+    if state is None:
+        state = {"pgn": os.path.abspath(args.pgn), "offset": 0, "games": 0}
+        open(args.output, "w").close()
+    else:
+        print(f"Resuming after {state['games']} games", file=sys.stderr)
+
+    workers = max(1, args.workers)
+    in_flight = collections.deque()
+    start_games = state["games"]
+
+    with open(args.pgn, encoding="utf-8", errors="replace") as pgn_file, \
+            open(args.output, "a", encoding="utf-8") as output, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_analysis_worker) as pool:
+        pgn_file.seek(state["offset"])
+
+        def write_oldest():
+            # Results are written in input order, so the saved offset always covers a prefix
+            offset, end, game, future = in_flight.popleft()
+            evals = future.result()
+            if args.format == "pgn":
+                output.write(annotate_pgn(game, evals))
+            else:
+                output.write(annotate_json(game, evals, offset))
+            output.flush()
+            state["offset"] = end
+            state["games"] += 1
+            write_offset(offset_path, state)
+
+        for offset, end, game in games_with_offsets(pgn_file):
+            if args.max_games is not None and state["games"] + len(in_flight) - start_games >= args.max_games:
+                break
+            moves = [move.uci() for move in game.mainline_moves()]
+            future = pool.submit(analyze_game, game.board().fen(), moves, args.depth, args.time)
+            in_flight.append((offset, end, game, future))
+            # Backpressure: don't read further ahead than the workers can take
+            if len(in_flight) >= workers * IN_FLIGHT_PER_WORKER:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+
+    print(f"{state['games'] - start_games} games analyzed, {state['games']} in total", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
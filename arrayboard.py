@@ -0,0 +1,392 @@
+import chess
+
+# Compact search board: a 10x12 mailbox of plain ints with in-place make/unmake, and a legal
+# move generator that returns moves as ints. No objects are created per move, which is what
+# makes chess.Board.push/pop and legal_moves expensive in a tight loop. Convert at the root
+# with ArrayBoard.from_board() / to_board() and move_to_chess(), or keep one in step with a
+# chess.Board by making every pushed move with encode_move() (the search's quiescence does).
+#
+# Squares are mailbox indexes, a1 = 21 ... h8 = 98; the two border rows and columns are
+# OFFBOARD so knight jumps and rays stop without bounds checks. Pieces are the python-chess
+# piece types, positive for white and negative for black.
+#
+# Move int: from | to << 7 | promotion piece type << 14 | flags << 17
+
+EMPTY = 0
+OFFBOARD = 100
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING
+
+FLAG_EN_PASSANT = 1
+FLAG_CASTLING = 2
+FLAG_DOUBLE_PUSH = 4
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+KNIGHT_STEPS = (-21, -19, -12, -8, 8, 12, 19, 21)
+KING_STEPS = (-11, -10, -9, -1, 1, 9, 10, 11)
+BISHOP_STEPS = (-11, -9, 9, 11)
+ROOK_STEPS = (-10, -1, 1, 10)
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+def mailbox(square):
+    # python-chess square (0-63) -> mailbox index
+    return 21 + chess.square_file(square) + 10 * chess.square_rank(square)
+
+def square64(index):
+    # mailbox index -> python-chess square
+    return (index // 10 - 2) * 8 + index % 10 - 1
+
+ON_BOARD = [mailbox(square) for square in chess.SQUARES]
+SQUARE64 = [0] * 120
+for _index in ON_BOARD:
+    SQUARE64[_index] = square64(_index)
+
+# Castling rights that survive a move from or to a square (king and rook home squares clear them)
+CASTLING_MASK = [15] * 120
+CASTLING_MASK[mailbox(chess.E1)] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[mailbox(chess.H1)] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASK[mailbox(chess.A1)] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASK[mailbox(chess.E8)] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[mailbox(chess.H8)] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASK[mailbox(chess.A8)] = 15 & ~BLACK_QUEENSIDE
+
+class ArrayBoard:
+    __slots__ = ("squares", "white", "castling", "ep_square", "halfmove_clock", "fullmove_number", "kings", "undo")
+
+    def __init__(self, fen=chess.STARTING_FEN):
+        self.squares = [OFFBOARD] * 120
+        self.undo = [] #(move, captured, castling, ep_square, halfmove_clock) per made move
+        self.set_board(chess.Board(fen))
+
+    @classmethod
+    def from_board(cls, board):
+        array_board = cls.__new__(cls)
+        array_board.squares = [OFFBOARD] * 120
+        array_board.undo = []
+        array_board.set_board(board)
+        return array_board
+
+    def set_board(self, board):
+        squares = self.squares
+        for square in chess.SQUARES:
+            piece = board.piece_at(square)
+            squares[mailbox(square)] = EMPTY if piece is None else (piece.piece_type if piece.color else -piece.piece_type)
+        self.white = board.turn == chess.WHITE
+        self.castling = (
+            (WHITE_KINGSIDE if board.has_kingside_castling_rights(chess.WHITE) else 0)
+            | (WHITE_QUEENSIDE if board.has_queenside_castling_rights(chess.WHITE) else 0)
+            | (BLACK_KINGSIDE if board.has_kingside_castling_rights(chess.BLACK) else 0)
+            | (BLACK_QUEENSIDE if board.has_queenside_castling_rights(chess.BLACK) else 0)
+        )
+        self.ep_square = mailbox(board.ep_square) if board.ep_square is not None else 0
+        self.halfmove_clock = board.halfmove_clock
+        self.fullmove_number = board.fullmove_number
+        self.kings = [mailbox(board.king(chess.BLACK)), mailbox(board.king(chess.WHITE))] #[black, white]
+        self.undo = []
+
+    def to_board(self):
+        board = chess.Board(None)
+        for index in ON_BOARD:
+            piece = self.squares[index]
+            if piece:
+                board.set_piece_at(SQUARE64[index], chess.Piece(abs(piece), piece > 0))
+        board.turn = self.white
+        fen_castling = "".join(flag for bit, flag in ((WHITE_KINGSIDE, "K"), (WHITE_QUEENSIDE, "Q"),
+                                                     (BLACK_KINGSIDE, "k"), (BLACK_QUEENSIDE, "q"))
+                               if self.castling & bit)
+        board.set_castling_fen(fen_castling or "-")
+        board.ep_square = SQUARE64[self.ep_square] if self.ep_square else None
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        return board
+
+    def move_to_chess(self, move):
+        promotion = (move >> 14) & 7
+        return chess.Move(SQUARE64[move & 127], SQUARE64[(move >> 7) & 127], promotion or None)
+
+    def move_from_chess(self, chess_move):
+        # The legal int move matching a chess.Move, None if it isn't legal here
+        for move in self.legal_moves():
+            if self.move_to_chess(move) == chess_move:
+                return move
+        return None
+
+    def make(self, move):
+        squares = self.squares
+        from_square = move & 127
+        to_square = (move >> 7) & 127
+        flags = move >> 17
+        piece = squares[from_square]
+        captured = squares[to_square]
+        self.undo.append((move, captured, self.castling, self.ep_square, self.halfmove_clock))
+
+        promotion = (move >> 14) & 7
+        if promotion:
+            squares[to_square] = promotion if self.white else -promotion
+        else:
+            squares[to_square] = piece
+        squares[from_square] = EMPTY
+
+        if flags:
+            if flags & FLAG_EN_PASSANT:
+                squares[to_square - 10 if self.white else to_square + 10] = EMPTY
+            elif flags & FLAG_CASTLING:
+                if to_square > from_square: #king side: rook h -> f
+                    squares[from_square + 1] = squares[from_square + 3]
+                    squares[from_square + 3] = EMPTY
+                else: #queen side: rook a -> d
+                    squares[from_square - 1] = squares[from_square - 4]
+                    squares[from_square - 4] = EMPTY
+        if piece == KING or piece == -KING:
+            self.kings[self.white] = to_square
+
+        self.castling &= CASTLING_MASK[from_square] & CASTLING_MASK[to_square]
+        self.ep_square = (from_square + to_square) // 2 if flags & FLAG_DOUBLE_PUSH else 0
+        if piece == PAWN or piece == -PAWN or captured:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not self.white:
+            self.fullmove_number += 1
+        self.white = not self.white
+
+    def unmake(self):
+        move, captured, self.castling, self.ep_square, self.halfmove_clock = self.undo.pop()
+        self.white = not self.white
+        if not self.white:
+            self.fullmove_number -= 1
+        squares = self.squares
+        from_square = move & 127
+        to_square = (move >> 7) & 127
+        flags = move >> 17
+
+        piece = squares[to_square]
+        if (move >> 14) & 7:
+            piece = PAWN if self.white else -PAWN
+        squares[from_square] = piece
+        squares[to_square] = captured
+
+        if flags:
+            if flags & FLAG_EN_PASSANT:
+                squares[to_square - 10 if self.white else to_square + 10] = -PAWN if self.white else PAWN
+            elif flags & FLAG_CASTLING:
+                if to_square > from_square:
+                    squares[from_square + 3] = squares[from_square + 1]
+                    squares[from_square + 1] = EMPTY
+                else:
+                    squares[from_square - 4] = squares[from_square - 1]
+                    squares[from_square - 1] = EMPTY
+        if piece == KING or piece == -KING:
+            self.kings[self.white] = from_square
+
+    def is_attacked(self, square, by_white):
+        squares = self.squares
+        sign = 1 if by_white else -1
+        # Pawns attack diagonally forward, so look backward from the square
+        pawn = PAWN * sign
+        if by_white:
+            if squares[square - 9] == pawn or squares[square - 11] == pawn:
+                return True
+        elif squares[square + 9] == pawn or squares[square + 11] == pawn:
+            return True
+        knight = KNIGHT * sign
+        for step in KNIGHT_STEPS:
+            if squares[square + step] == knight:
+                return True
+        king = KING * sign
+        for step in KING_STEPS:
+            if squares[square + step] == king:
+                return True
+        bishop, rook, queen = BISHOP * sign, ROOK * sign, QUEEN * sign
+        for step in BISHOP_STEPS:
+            target = square + step
+            piece = squares[target]
+            while piece == EMPTY:
+                target += step
+                piece = squares[target]
+            if piece == bishop or piece == queen:
+                return True
+        for step in ROOK_STEPS:
+            target = square + step
+            piece = squares[target]
+            while piece == EMPTY:
+                target += step
+                piece = squares[target]
+            if piece == rook or piece == queen:
+                return True
+        return False
+
+    def in_check(self):
+        return self.is_attacked(self.kings[self.white], not self.white)
+
+    def pinned(self):
+        # Own pieces standing between the king and an enemy slider on the same line. When not in
+        # check, only their moves, king moves and en passant can leave the king attacked.
+        squares = self.squares
+        white = self.white
+        king = self.kings[white]
+        pinned = []
+        for step in KING_STEPS:
+            square = king + step
+            piece = squares[square]
+            while piece == EMPTY:
+                square += step
+                piece = squares[square]
+            if piece == OFFBOARD or (piece > 0) != white:
+                continue
+            target = square + step
+            attacker = squares[target]
+            while attacker == EMPTY:
+                target += step
+                attacker = squares[target]
+            if attacker != OFFBOARD and (attacker > 0) != white:
+                attacker = attacker if attacker > 0 else -attacker
+                if attacker == QUEEN or attacker == (BISHOP if step in BISHOP_STEPS else ROOK):
+                    pinned.append(square)
+        return pinned
+
+    def check_blocks(self):
+        # Squares a move other than the king's has to go to when in check: the checking piece and
+        # the squares between it and the king. Empty in double check, only the king can move then.
+        squares = self.squares
+        white = self.white
+        king = self.kings[white]
+        sign = -1 if white else 1 #enemy pieces
+        checks = []
+        pawn = PAWN * sign
+        for square in ((king + 9, king + 11) if white else (king - 11, king - 9)):
+            if squares[square] == pawn:
+                checks.append([square])
+        knight = KNIGHT * sign
+        for step in KNIGHT_STEPS:
+            if squares[king + step] == knight:
+                checks.append([king + step])
+        for step in KING_STEPS:
+            line = []
+            square = king + step
+            piece = squares[square]
+            while piece == EMPTY:
+                line.append(square)
+                square += step
+                piece = squares[square]
+            if piece != OFFBOARD and (piece > 0) != white:
+                piece = piece if piece > 0 else -piece
+                if piece == QUEEN or piece == (BISHOP if step in BISHOP_STEPS else ROOK):
+                    line.append(square)
+                    checks.append(line)
+        return set(checks[0]) if len(checks) == 1 else set()
+
+    def pseudo_legal_moves(self):
+        squares = self.squares
+        white = self.white
+        forward = 10 if white else -10
+        start_rank = 3 if white else 8 #mailbox row of the pawns' home rank
+        last_rank = 9 if white else 2 #mailbox row of the promotion rank
+
+        for from_square in ON_BOARD:
+            piece = squares[from_square]
+            if piece == EMPTY or (piece > 0) != white:
+                continue
+            piece_type = piece if piece > 0 else -piece
+
+            if piece_type == PAWN:
+                to_square = from_square + forward
+                if squares[to_square] == EMPTY:
+                    if to_square // 10 == last_rank:
+                        for promotion in PROMOTIONS:
+                            yield from_square | to_square << 7 | promotion << 14
+                    else:
+                        yield from_square | to_square << 7
+                        if from_square // 10 == start_rank and squares[to_square + forward] == EMPTY:
+                            yield from_square | (to_square + forward) << 7 | FLAG_DOUBLE_PUSH << 17
+                for to_square in (from_square + forward - 1, from_square + forward + 1):
+                    target = squares[to_square]
+                    if target != OFFBOARD and target != EMPTY and (target > 0) != white:
+                        if to_square // 10 == last_rank:
+                            for promotion in PROMOTIONS:
+                                yield from_square | to_square << 7 | promotion << 14
+                        else:
+                            yield from_square | to_square << 7
+                    elif to_square == self.ep_square and target == EMPTY:
+                        yield from_square | to_square << 7 | FLAG_EN_PASSANT << 17
+
+            elif piece_type == KNIGHT or piece_type == KING:
+                for step in (KNIGHT_STEPS if piece_type == KNIGHT else KING_STEPS):
+                    to_square = from_square + step
+                    target = squares[to_square]
+                    if target == EMPTY or (target != OFFBOARD and (target > 0) != white):
+                        yield from_square | to_square << 7
+
+            else:
+                if piece_type == BISHOP:
+                    steps = BISHOP_STEPS
+                elif piece_type == ROOK:
+                    steps = ROOK_STEPS
+                else:
+                    steps = KING_STEPS #queen: every direction, sliding
+                for step in steps:
+                    to_square = from_square + step
+                    target = squares[to_square]
+                    while target == EMPTY:
+                        yield from_square | to_square << 7
+                        to_square += step
+                        target = squares[to_square]
+                    if target != OFFBOARD and (target > 0) != white:
+                        yield from_square | to_square << 7
+
+    def castling_moves(self):
+        # King and rook unmoved (rights), squares between empty, king not passing through check
+        squares = self.squares
+        moves = []
+        if self.white:
+            king, kingside, queenside, by_white = 25, WHITE_KINGSIDE, WHITE_QUEENSIDE, False
+        else:
+            king, kingside, queenside, by_white = 95, BLACK_KINGSIDE, BLACK_QUEENSIDE, True
+        if self.castling & kingside and squares[king + 1] == EMPTY and squares[king + 2] == EMPTY:
+            if not self.is_attacked(king + 1, by_white) and not self.is_attacked(king + 2, by_white):
+                moves.append(king | (king + 2) << 7 | FLAG_CASTLING << 17)
+        if self.castling & queenside and squares[king - 1] == EMPTY and squares[king - 2] == EMPTY and squares[king - 3] == EMPTY:
+            if not self.is_attacked(king - 1, by_white) and not self.is_attacked(king - 2, by_white):
+                moves.append(king | (king - 2) << 7 | FLAG_CASTLING << 17)
+        return moves
+
+    def legal_moves(self):
+        white = self.white
+        king = self.kings[white]
+        in_check = self.is_attacked(king, not white)
+        pinned = self.pinned()
+        blocks = self.check_blocks() if in_check else None
+        legal = []
+        for move in self.pseudo_legal_moves():
+            from_square = move & 127
+            if in_check and from_square != king and ((move >> 7) & 127) not in blocks and not (move >> 17) & FLAG_EN_PASSANT:
+                continue #neither takes the checking piece nor blocks it
+            # Only king moves, en passant, and moves of pinned pieces can leave the king attacked
+            # (when not in check already); everything else is legal as is
+            if in_check or from_square == king or from_square in pinned or (move >> 17) & FLAG_EN_PASSANT:
+                self.make(move)
+                attacked = self.is_attacked(self.kings[white], not white)
+                self.unmake()
+                if attacked:
+                    continue
+            legal.append(move)
+        if not in_check and self.castling:
+            legal.extend(self.castling_moves())
+        return legal
+
+    def perft(self, depth, bulk=True):
+        if depth == 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1 and bulk:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.make(move)
+            nodes += self.perft(depth - 1, bulk)
+            self.unmake()
+        return nodes
@@ -0,0 +1,53 @@
+import chess
+import numpy as np
+
+from engine import Engine
+
+# Batched evaluation for offline analysis and self-play: scores many positions at once with
+# NumPy instead of one chess.Board at a time. Needs numpy, the game and the search don't.
+#
+# A batch is an (n, 12) uint64 array of piece bitboards, one row per position, in
+# BITBOARD_ORDER. The bits are unpacked to an (n, 768) 0/1 matrix and multiplied with the
+# piece value + piece table score of every (piece, square), which is what evaluate_material sums.
+
+BITBOARD_ORDER = [(color, piece_type) for color in (chess.WHITE, chess.BLACK) for piece_type in chess.PIECE_TYPES]
+
+class BatchEvaluator:
+    def __init__(self, engine=None):
+        # Same numbers as the engine: square_scores is piece_values + piece_tables, signed and mirrored
+        self.engine = engine or Engine()
+        scores = self.engine.square_scores
+        self.weights = np.array(
+            [scores[color][piece_type] for color, piece_type in BITBOARD_ORDER],
+            dtype=np.float64
+        ).reshape(768) #float so the product runs through BLAS, every score is an exact small integer
+
+    def pack(self, boards):
+        # (n, 12) uint64 bitboards of the boards, in BITBOARD_ORDER
+        return np.array(
+            [[board.pieces_mask(piece_type, color) for color, piece_type in BITBOARD_ORDER] for board in boards],
+            dtype=np.uint64
+        ).reshape(len(boards), 12)
+
+    def evaluate_bitboards(self, bitboards):
+        # Material + position score of every row, same as Engine.evaluate_material
+        bitboards = np.ascontiguousarray(bitboards, dtype="<u8")
+        count = bitboards.shape[0]
+        # Little-endian bytes, unpacked low bit first: bit i of a bitboard lands in column i = square i
+        bits = np.unpackbits(bitboards.view(np.uint8), axis=1, bitorder="little")
+        return (bits.reshape(count, 768) @ self.weights).astype(np.int64)
+
+    def evaluate_boards(self, boards):
+        # Same scores as Engine.evaluate_position, game endings included. The endings need a
+        # legal move check per board and the pawn structure / tapered terms come from the
+        # engine's cached tables one board at a time, so evaluate_bitboards(pack(boards)) is
+        # the fast path when material + piece tables are enough.
+        values = self.evaluate_bitboards(self.pack(boards))
+        for index, board in enumerate(boards):
+            if board.is_checkmate():
+                values[index] = -10000 if board.turn == chess.WHITE else 10000
+            elif board.is_stalemate() or board.is_insufficient_material():
+                values[index] = 0
+            else:
+                values[index] += self.engine.evaluate_structure(board)
+        return values
@@ -0,0 +1,294 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import chess
+
+from arrayboard import ArrayBoard
+from engine import Engine
+
+# Benchmark for the engine: searches a fixed set of positions at every difficulty level and
+# prints the numbers as JSON, so two versions can be compared with a plain diff.
+#   python bench.py                   search benchmark, levels 1-5
+#   python bench.py --levels 1-3      only the lower levels
+#   python bench.py --disable staged  move generation all at once instead of in stages, to compare
+#   python bench.py perft --depth 4   move generation throughput, python-chess vs ArrayBoard
+#   python bench.py perft --leaf-moves  same, making every leaf move like the search does
+#   python bench.py features --levels 4  nodes at equal depth with each search feature switched on
+#   python bench.py eval              one-at-a-time vs batched NumPy evaluation (needs numpy)
+
+BENCH_POSITIONS = [
+    # (name, category, fen)
+    ("start", "opening", chess.STARTING_FEN),
+    ("italian", "opening", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("queens-gambit", "opening", "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4"),
+    ("kiwipete", "middlegame", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("scholars-mate", "middlegame", "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - 2 4"),
+    ("open-center", "middlegame", "r2q1rk1/ppp2ppp/2n1bn2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 0 7"),
+    ("hanging-pieces", "middlegame", "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2QKB1R w KQ - 0 8"),
+    ("rook-endgame", "endgame", "8/8/1k6/8/2R5/8/5K2/4r3 w - - 0 1"),
+    ("pawn-race", "endgame", "8/5k2/8/3K4/8/8/3P4/8 w - - 0 1"),
+    ("position-3", "endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+]
+
+# Standard perft positions with their known node counts per depth
+PERFT_POSITIONS = [
+    ("start", chess.STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862, 4085603]),
+    ("position-3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812, 43238, 674624]),
+    ("position-4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467, 422333]),
+    ("position-5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379, 2103487]),
+]
+
+# Search features that can be switched off for comparison, engine attribute -> name in the report
+SEARCH_FEATURES = [("use_pvs", "pvs"), ("use_null_move", "null_move"), ("use_lmr", "lmr"), ("use_staged_movegen", "staged")]
+
+def run_search_bench(levels, workers, disabled=()):
+    results = []
+    for level in levels:
+        level_nodes = 0
+        level_time = 0.0
+        positions = []
+        for name, category, fen in BENCH_POSITIONS:
+            # Fresh engine, so every run starts with an empty transposition table
+            engine = Engine()
+            engine.workers = workers
+            for attribute in disabled:
+                setattr(engine, attribute, False)
+            iterations = []
+            engine.search(chess.Board(fen), level, info=iterations.append)
+            stats = engine.search_stats()
+            engine.shutdown_search_pool()
+
+            elapsed = iterations[-1]["time"] if iterations else 0.0
+            nodes = stats["nodes"]
+            level_nodes += nodes
+            level_time += elapsed
+            positions.append({
+                "name": name,
+                "category": category,
+                "depth": stats["depth"],
+                "nodes": nodes,
+                "time": round(elapsed, 4),
+                "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+                "evals": stats["evals"],
+                "evals_per_second": int(stats["evals"] / elapsed) if elapsed > 0 else 0,
+                "time_to_depth": [round(info["time"], 4) for info in iterations],
+                "nodes_to_depth": [info["nodes"] for info in iterations],
+                "branching_factor": round(branching_factor(iterations), 3),
+                "first_move_cutoff_rate": round(stats["first_move_cutoff_rate"], 4),
+                "null_cutoffs": stats["null_cutoffs"],
+                "lmr_reductions": stats["lmr_reductions"],
+                "researches": stats["researches"],
+                "quiet_generations": stats["quiet_generations"], #nodes that needed their quiet moves
+                "best_move": iterations[-1]["pv"][0].uci() if iterations and iterations[-1]["pv"] else None,
+                "score": iterations[-1]["score"] if iterations else None,
+            })
+        results.append({
+            "level": level,
+            "nodes": level_nodes,
+            "time": round(level_time, 4),
+            "nps": int(level_nodes / level_time) if level_time > 0 else 0,
+            "positions": positions,
+        })
+    return results
+
+def run_features_bench(levels):
+    # Same depth with no feature, each feature alone and all of them, so the node count change
+    # of every feature can be read off directly
+    attributes = [attribute for attribute, _ in SEARCH_FEATURES]
+    configs = [("none", attributes)]
+    configs += [(name, [other for other in attributes if other != attribute]) for attribute, name in SEARCH_FEATURES]
+    configs.append(("all", []))
+
+    results = []
+    for name, disabled in configs:
+        for level in run_search_bench(levels, 1, disabled):
+            results.append({
+                "features": name,
+                "level": level["level"],
+                "nodes": level["nodes"],
+                "time": level["time"],
+                "best_moves": {position["name"]: position["best_move"] for position in level["positions"]},
+            })
+    baseline = {entry["level"]: entry["nodes"] for entry in results if entry["features"] == "none"}
+    for entry in results:
+        entry["nodes_vs_none"] = round(entry["nodes"] / baseline[entry["level"]], 3) if baseline[entry["level"]] else 0.0
+    return results
+
+def branching_factor(iterations):
+    # Effective branching factor: nodes of the last iteration over nodes of the one before
+    if len(iterations) < 2:
+        return 0.0
+    last = iterations[-1]["nodes"] - iterations[-2]["nodes"]
+    previous = iterations[-2]["nodes"] - (iterations[-3]["nodes"] if len(iterations) > 2 else 0)
+    return last / previous if previous > 0 else 0.0
+
+def perft(board, depth, bulk=True):
+    if depth == 1 and bulk:
+        return board.legal_moves.count()
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += perft(board, depth - 1, bulk)
+        board.pop()
+    return nodes
+
+def run_perft_bench(max_depth, boards=("python-chess", "array"), bulk=True):
+    # bulk: count the moves at the last ply instead of making them. The search makes every move,
+    # so bulk=False is the closer match for its make/unmake cost.
+    results = []
+    for name, fen, expected in PERFT_POSITIONS:
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            nps = {}
+            for board_name in boards:
+                if board_name == "array":
+                    board = ArrayBoard.from_board(chess.Board(fen))
+                    start = time.perf_counter()
+                    nodes = board.perft(depth, bulk)
+                else:
+                    board = chess.Board(fen)
+                    start = time.perf_counter()
+                    nodes = perft(board, depth, bulk)
+                elapsed = time.perf_counter() - start
+                nps[board_name] = int(nodes / elapsed) if elapsed > 0 else 0
+                results.append({
+                    "name": name,
+                    "board": board_name,
+                    "depth": depth,
+                    "nodes": nodes,
+                    "expected": expected[depth - 1],
+                    "ok": nodes == expected[depth - 1],
+                    "time": round(elapsed, 4),
+                    "nps": nps[board_name],
+                })
+            if len(nps) == 2 and nps["python-chess"]:
+                results[-1]["speedup"] = round(nps["array"] / nps["python-chess"], 2)
+    return results
+
+def random_positions(count, seed=1):
+    # Every position along random playouts of the bench positions, the same ones on every run
+    rng = random.Random(seed)
+    positions = []
+    board = None
+    while len(positions) < count:
+        moves = list(board.legal_moves) if board is not None and board.ply() < 60 else []
+        if not moves:
+            board = chess.Board(rng.choice(BENCH_POSITIONS)[2])
+        else:
+            board.push(rng.choice(moves))
+        positions.append(board.copy(stack=False))
+    return positions
+
+def run_eval_bench(batch_sizes):
+    from batch_eval import BatchEvaluator #numpy is only needed for this mode
+
+    engine = Engine()
+    evaluator = BatchEvaluator(engine)
+    results = []
+    for batch_size in batch_sizes:
+        boards = random_positions(batch_size)
+
+        start = time.perf_counter()
+        expected = [engine.evaluate_position(board) for board in boards]
+        position_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for board in boards:
+            engine.evaluate_material(board)
+        material_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bitboards = evaluator.pack(boards)
+        pack_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        evaluator.evaluate_bitboards(bitboards)
+        batch_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        values = evaluator.evaluate_boards(boards)
+        boards_time = time.perf_counter() - start
+
+        results.append({
+            "batch_size": batch_size,
+            "identical": values.tolist() == expected,
+            # evaluate_position vs evaluate_boards (game endings included)
+            "position_per_second": int(batch_size / position_time) if position_time > 0 else 0,
+            "boards_per_second": int(batch_size / boards_time) if boards_time > 0 else 0,
+            # evaluate_material vs evaluate_bitboards (material + piece tables only)
+            "material_per_second": int(batch_size / material_time) if material_time > 0 else 0,
+            "batch_per_second": int(batch_size / batch_time) if batch_time > 0 else 0,
+            "pack_per_second": int(batch_size / pack_time) if pack_time > 0 else 0,
+            "speedup": round(material_time / batch_time, 1) if batch_time > 0 else 0.0,
+        })
+    return results
+
+def parse_levels(text):
+    # "3" or "1-5" or "1,3,5"
+    levels = []
+    for part in text.split(","):
+        if "-" in part:
+            low, high = part.split("-")
+            levels.extend(range(int(low), int(high) + 1))
+        else:
+            levels.append(int(part))
+    return levels
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chess engine")
+    parser.add_argument("mode", nargs="?", choices=["search", "perft", "eval", "features"], default="search")
+    parser.add_argument("--levels", default="1-5", help="difficulty levels (search depths) to run, e.g. 1-5 or 2,4")
+    parser.add_argument("--depth", type=int, default=4, help="maximum perft depth")
+    parser.add_argument("--board", choices=["python-chess", "array", "both"], default="both", help="perft board implementation")
+    parser.add_argument("--leaf-moves", action="store_true", help="perft makes and unmakes the last ply too, like the search")
+    parser.add_argument("--disable", default="", help="search features to switch off, e.g. pvs,null_move,lmr,staged")
+    parser.add_argument("--batch-sizes", default="1,16,256,4096,65536", help="eval mode batch sizes, e.g. 1,256,4096")
+    parser.add_argument("--workers", type=int, default=1, help="search processes")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {
+        "mode": args.mode,
+        "python": platform.python_version(),
+        "python_chess": chess.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if args.mode == "perft":
+        boards = ("python-chess", "array") if args.board == "both" else (args.board,)
+        report["bulk"] = not args.leaf_moves
+        report["perft"] = run_perft_bench(args.depth, boards, not args.leaf_moves)
+    elif args.mode == "features":
+        report["features"] = run_features_bench(parse_levels(args.levels))
+    elif args.mode == "eval":
+        report["eval"] = run_eval_bench([int(size) for size in args.batch_sizes.split(",")])
+    else:
+        names = dict((name, attribute) for attribute, name in SEARCH_FEATURES)
+        disabled = [names[name] for name in filter(None, args.disable.split(","))]
+        report["workers"] = args.workers
+        report["disabled"] = args.disable.split(",") if args.disable else []
+        report["levels"] = run_search_bench(parse_levels(args.levels), args.workers, disabled)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+    # Non-zero exit when move generation disagrees with the reference counts
+    if args.mode == "perft" and not all(entry["ok"] for entry in report["perft"]):
+        return 1
+    # Same for a batch evaluation that doesn't match evaluate_position
+    if args.mode == "eval" and not all(entry["identical"] for entry in report["eval"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import argparse
+import random
+import struct
+import sys
+from collections import defaultdict
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+# Polyglot opening book. Known opening lines are played straight from the book instead of
+# searching them again in every game.
+#   python book.py games.pgn -o book.bin               build a book from a PGN collection
+#   python book.py games.pgn -o book.bin --max-ply 16  only the first 16 plies of every game
+
+DEFAULT_BOOK_PATH = "book.bin"
+DEFAULT_BOOK_PLY = 20 #the book is only asked for the first this many plies of a game
+ENTRY_STRUCT = struct.Struct(">QHHI") #key, move, weight, learn; big-endian, sorted by key
+MAX_WEIGHT = 0xFFFF
+
+class OpeningBook:
+    # python-chess reads the file through mmap and binary-searches the sorted keys, so
+    # opening a large book is instant and a probe only touches a few pages
+    def __init__(self, path, max_ply=DEFAULT_BOOK_PLY, rng=None):
+        self.path = path
+        self.max_ply = max_ply
+        self.rng = rng or random.Random()
+        self.reader = chess.polyglot.open_reader(path)
+
+    def probe(self, board):
+        # Book move for the position picked at random by weight, None when out of book
+        if board.ply() >= self.max_ply:
+            return None
+        try:
+            return self.reader.weighted_choice(board, random=self.rng).move
+        except IndexError:
+            return None
+
+    def close(self):
+        self.reader.close()
+
+def encode_move(board, move):
+    # Polyglot move: to square in bits 0-5, from square in bits 6-11, promotion piece in 12-14.
+    # Castling is stored as the king capturing its own rook.
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if board.is_kingside_castling(move) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | (move.from_square << 6) | (promotion << 12)
+
+def collect_moves(pgn_file, max_ply, counts):
+    # counts[(key, raw_move)] = [games, score]; score is 2 per win and 1 per draw for the mover
+    games = 0
+    while True:
+        game = chess.pgn.read_game(pgn_file)
+        if game is None:
+            break
+        games += 1
+        result = game.headers.get("Result", "*")
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= max_ply:
+                break
+            if result == "1/2-1/2":
+                score = 1
+            elif result == ("1-0" if board.turn == chess.WHITE else "0-1"):
+                score = 2
+            else:
+                score = 0
+            entry = counts[(chess.polyglot.zobrist_hash(board), encode_move(board, move))]
+            entry[0] += 1
+            entry[1] += score
+            board.push(move)
+    return games
+
+def build_entries(counts, min_games):
+    # Weight = score of the move, scaled down so the largest fits into 16 bits. Moves that only
+    # ever lost get weight 0 and are dropped, just like moves seen in too few games.
+    kept = [(key, raw_move, score) for (key, raw_move), (games, score) in counts.items()
+            if games >= min_games and score > 0]
+    top = max((score for _, _, score in kept), default=0)
+    scale = MAX_WEIGHT / top if top > MAX_WEIGHT else 1
+    entries = []
+    for key, raw_move, score in kept:
+        weight = max(1, int(score * scale))
+        entries.append((key, raw_move, weight))
+    entries.sort()
+    return entries
+
+def write_book(path, entries):
+    with open(path, "wb") as book_file:
+        for key, raw_move, weight in entries:
+            book_file.write(ENTRY_STRUCT.pack(key, raw_move, weight, 0))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a Polyglot opening book from PGN files")
+    parser.add_argument("pgn", nargs="+", help="PGN files with the games")
+    parser.add_argument("-o", "--output", default=DEFAULT_BOOK_PATH, help="book file to write")
+    parser.add_argument("--max-ply", type=int, default=DEFAULT_BOOK_PLY, help="plies of every game to put in the book")
+    parser.add_argument("--min-games", type=int, default=2, help="drop moves played in fewer games than this")
+    args = parser.parse_args(argv)
+
+    counts = defaultdict(lambda: [0, 0])
+    games = 0
+    for path in args.pgn:
+        with open(path, encoding="utf-8", errors="replace") as pgn_file:
+            games += collect_moves(pgn_file, args.max_ply, counts)
+
+    entries = build_entries(counts, args.min_games)
+    write_book(args.output, entries)
+    print(f"{games} games, {len(entries)} book entries written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
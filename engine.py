@@ -0,0 +1,1573 @@
+import chess
+import chess.polyglot
+import collections
+import math
+import multiprocessing
+import threading
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from hashfile import HASH_FILE_MIN_DEPTH, open_hash_file
+from tablebase import DEFAULT_TB_PIECES, TB_WIN, max_pieces, open_tablebase
+
+# Chess engine behind the game: search, evaluation and the tables they use.
+# Nothing in here imports Tkinter, so it runs the same on a server without a display.
+
+# Bound types stored in the transposition table
+TT_EXACT = 0
+TT_LOWER = 1 #score is at least this much (search failed high)
+TT_UPPER = 2 #score is at most this much (search failed low)
+
+MAX_PLY = 64 #deepest ply the search keeps killer moves for
+
+# Tablebase scores count the plies from the root (TB_WIN - ply), which means nothing in another
+# search. The tables keep them counted from the position itself, converted on the way in and out.
+TB_SCORE_MIN = TB_WIN - 1000 #scores between this and TB_WIN are tablebase wins
+
+def score_to_tt(score, ply):
+    if TB_SCORE_MIN <= score <= TB_WIN:
+        return score + ply
+    if -TB_WIN <= score <= -TB_SCORE_MIN:
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if TB_SCORE_MIN <= score <= TB_WIN:
+        return score - ply
+    if -TB_WIN <= score <= -TB_SCORE_MIN:
+        return score + ply
+    return score
+
+# Move ordering scores, every group is sorted inside its own band
+ORDER_HASH_MOVE = 10000000
+ORDER_CAPTURE = 1000000
+ORDER_PROMOTION = 900000
+ORDER_KILLER = 800000
+HISTORY_LIMIT = 500000 #history scores are halved before they reach the killer band
+
+REPETITION_PLIES = 16 #a position can't occur five times with fewer reversible plies than this
+ZOBRIST = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+ZOBRIST_TURN = chess.polyglot.POLYGLOT_RANDOM_ARRAY[780] #xored in when white is to move
+
+NULL_MOVE_REDUCTION = 2 #the null move is searched this many plies shallower than the real moves
+LMR_MIN_DEPTH = 3 #late move reductions only with at least this much depth left
+LMR_MIN_INDEX = 3 #moves before this place in the ordering (hash move, captures, killers) are never reduced
+
+DELTA_MARGIN = 200 #quiescence skips captures that can't lift the score near alpha even with this bonus
+
+EVAL_VERSION = 3 #bump with every change to the evaluation or the stored scores, hash files of older scores are refused
+
+# Tapered evaluation: terms have a middlegame and an endgame value, mixed by the game phase
+PHASE_WEIGHTS = {chess.KNIGHT: 1, chess.BISHOP: 1, chess.ROOK: 2, chess.QUEEN: 4}
+MAX_PHASE = 24 #phase of the starting material, 0 = only kings and pawns
+DOUBLED_PAWN = (-10, -20) #(middlegame, endgame) per extra pawn on a file
+ISOLATED_PAWN = (-15, -20) #per pawn without own pawns on the neighbouring files
+PASSED_PAWN = ([0, 5, 10, 15, 25, 40, 60, 0], [0, 10, 20, 35, 60, 90, 130, 0]) #by rank seen from the pawn's side
+BISHOP_PAIR = (30, 50)
+PAWN_CACHE_SIZE = 16384 #pawn structures kept, least recently used dropped first
+MATERIAL_CACHE_SIZE = 1024 #material signatures kept
+
+ADJACENT_FILES = [
+    (chess.BB_FILES[file - 1] if file > 0 else 0) | (chess.BB_FILES[file + 1] if file < 7 else 0)
+    for file in range(8)
+]
+
+def _passed_pawn_mask(color, square):
+    # Squares in front of the pawn on its own and the neighbouring files, no enemy pawn may stand there
+    file, rank = chess.square_file(square), chess.square_rank(square)
+    files = chess.BB_FILES[file] | ADJACENT_FILES[file]
+    ranks = range(rank + 1, 8) if color == chess.WHITE else range(0, rank)
+    mask = 0
+    for ahead in ranks:
+        mask |= chess.BB_RANKS[ahead]
+    return files & mask
+
+PASSED_PAWN_MASKS = [[_passed_pawn_mask(color, square) for square in chess.SQUARES] for color in chess.COLORS]
+
+class TranspositionTable:
+    # Fixed-size hash table keyed by the board's Zobrist hash.
+    # Every bucket has two slots: slot 0 keeps the deepest result (depth-preferred),
+    # slot 1 is overwritten every time (always-replace). Entries are kept between AI moves.
+    def __init__(self, size_bits=16):
+        self.size = 1 << size_bits #number of buckets
+        self.mask = self.size - 1
+        self.entries = [None] * (self.size * 2) #entry = (key, depth, score, bound, best_move, generation)
+        self.generation = 0 #bumped at every AI move, so old deep entries can be replaced
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0 #bucket was occupied by a different position
+        self.stores = 0
+    
+    def new_search(self):
+        self.generation += 1
+    
+    def probe(self, key):
+        index = (key & self.mask) * 2
+        deep = self.entries[index]
+        recent = self.entries[index + 1]
+        
+        if deep is not None and deep[0] == key:
+            self.hits += 1
+            return deep
+        if recent is not None and recent[0] == key:
+            self.hits += 1
+            return recent
+        
+        if deep is not None or recent is not None:
+            self.collisions += 1
+        self.misses += 1
+        return None
+    
+    def peek(self, key):
+        # Same as probe() but without touching the counters (used for PV extraction)
+        index = (key & self.mask) * 2
+        for entry in (self.entries[index], self.entries[index + 1]):
+            if entry is not None and entry[0] == key:
+                return entry
+        return None
+    
+    def store(self, key, depth, score, bound, best_move):
+        index = (key & self.mask) * 2
+        entry = (key, depth, score, bound, best_move, self.generation)
+        deep = self.entries[index]
+        self.stores += 1
+        
+        # Depth-preferred slot: same position, deeper search or entry left over from an older move
+        if deep is None or deep[0] == key or depth >= deep[1] or deep[5] != self.generation:
+            self.entries[index] = entry
+        else:
+            self.entries[index + 1] = entry
+    
+    def clear(self):
+        self.entries = [None] * (self.size * 2)
+        self.hits = self.misses = self.collisions = self.stores = 0
+    
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "filled": sum(1 for entry in self.entries if entry is not None),
+            "capacity": len(self.entries),
+        }
+
+class EvalCache:
+    # Size-bounded memo for evaluation terms, the least recently used entry is dropped when full
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def hit_rate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+    
+    def reset_stats(self):
+        self.hits = self.misses = 0
+
+class SearchAborted(Exception):
+    # Raised inside the search when it has been cancelled from the UI
+    pass
+
+class SearchTimeout(SearchAborted):
+    # Raised when the time or node budget of the current move has run out
+    pass
+
+class SearchHandle:
+    # Runs one AI search on a worker thread so the Tk event loop never freezes.
+    # The Tk thread polls done() with root.after and picks up result() when it has finished.
+    def __init__(self, search, board):
+        self.stop_event = threading.Event()
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(search, board), daemon=True)
+        self._thread.start()
+    
+    def _run(self, search, board):
+        try:
+            self._result = search(board, self.stop_event)
+        except SearchAborted:
+            pass #cancelled, nobody is waiting for the result
+        except Exception as error:
+            self._error = error
+    
+    def done(self):
+        return not self._thread.is_alive()
+    
+    def wait(self):
+        self._thread.join()
+    
+    def cancel(self):
+        # The search checks the event at every node, so the thread stops almost immediately
+        self.stop_event.set()
+        self._thread.join()
+    
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+class Engine:
+    def __init__(self):
+        self.tt = TranspositionTable() #remembers searched positions across moves
+        self.stop_event = threading.Event() #stop flag of the search currently running
+        self.stop_request = threading.Event() #"play now" flag of the search currently running, see search()
+        self.nodes = 0 #nodes searched for the current AI move
+        self.stop_time = None #time.monotonic() value when the current move has to be played
+        self.search_start = None #time.monotonic() value the time budget of the current move counts from
+        self.pondering = False #search runs on the opponent's time, its clock starts with ponderhit()
+        self.ponder_time_limit = None #time budget the ponder search gets on a ponder hit
+        self.ponder_hit_time = None #time.monotonic() of a ponderhit() that came before the search started its clock
+        self.ponder_lock = threading.Lock() #ponderhit() comes from another thread than the search
+        self.deadline = None #stop_time of the running iteration, None while depth 1 is searched
+        self.info = None #optional callback, gets a dict after every completed iteration
+        self.active_node_limit = None
+        self.pv_moves = {} #zobrist key -> move of the principal variation of the previous iteration
+        self.principal_variation = [] #best line found by the last completed iteration
+        self.completed_depth = 0
+        self.square_scores = self.build_square_scores() #piece_values + piece_tables, signed and mirrored
+        self.king_endgame_scores = self.build_king_endgame_scores() #endgame minus middlegame king table, signed
+        self.pawn_cache = EvalCache(PAWN_CACHE_SIZE) #pawn bitboards -> (middlegame, endgame) pawn structure score
+        self.material_cache = EvalCache(MATERIAL_CACHE_SIZE) #piece counts -> (phase, middlegame, endgame) score
+        self.use_eval_cache = True #False = pawn structure and material terms recomputed at every leaf, for comparison
+        self.eval_stack = [0] #material + position score of every position on the search path
+        self.piece_keys = [0] #Zobrist key of the piece placement only, for every position on the path
+        self.keys = [0] #full Zobrist keys of the game history (since the last irreversible move) + search path
+        self.square_keys = self.build_square_keys() #Zobrist numbers per [color][piece_type][square]
+        self.castling_keys = {} #castling_rights bitmask -> Zobrist part of the castling flags
+        self.debug_eval = False #cross-check the incremental score against a full rescan at every leaf
+        self.use_move_ordering = True #False = plain legal move order (hash move still first), for comparison
+        self.killers = [[None, None] for _ in range(MAX_PLY)] #two quiet moves per ply that caused a cutoff
+        self.history = [[0] * 4096, [0] * 4096] #[color][from * 64 + to] cutoff score of quiet moves
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.use_quiescence = True #resolve captures at depth 0 instead of evaluating mid-exchange
+        self.use_pvs = True #principal variation search: null window for every move after the first
+        self.use_null_move = True #null-move pruning
+        self.use_lmr = True #late move reductions for quiet moves far down the ordering
+        self.use_staged_movegen = True #hash move, captures, killers, quiets, each generated only when needed
+        self.quiet_generations = 0 #nodes of the staged search that got as far as generating quiet moves
+        self.null_cutoffs = 0
+        self.lmr_reductions = 0
+        self.researches = 0 #null-window or reduced searches that had to be repeated in full
+        self.max_qdepth = 6 #deepest capture sequence the quiescence search follows
+        self.qnodes = 0
+        self.evals = 0 #leaf evaluations of the current search
+        self.workers = 1 #processes for the root-parallel search, 1 = search on the worker thread only
+        self.search_pool = None #process pool, created on first use and reused for every move
+        self.search_pool_size = 0
+        self.shared_best = None #best root score found so far, shared with the worker processes
+        self.pool_stop = None #stop flag shared with the worker processes
+        self.book = None #OpeningBook to play known lines from, None = always search
+        self.tablebase_path = None #Syzygy directory, None = no tablebase probing
+        self.tb_max_pieces = DEFAULT_TB_PIECES #probe only with at most this many pieces on the board
+        self.tb_hits = 0 #positions of the current search scored by the tablebases
+        self.hash_file_path = None #HashFile shared between processes and runs, None = in-memory table only
+        self.hash_file = None #HashFile of the current search, None when off or made by another evaluation
+        self.hash_file_hits = 0 #positions of the current search found in the hash file
+    
+    def search(self, board, max_depth, time_limit=None, node_limit=None, stop_event=None, info=None, stop_request=None):
+        # Entry point for the front ends (Tk game, UCI). Setting stop_event throws the search
+        # away (SearchAborted); setting stop_request ends it early but still returns the best
+        # move so far. Both belong to this one search: create them on the calling thread before
+        # the search thread starts, so a stop sent right after "go" can't get lost.
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.stop_request = stop_request if stop_request is not None else threading.Event()
+        self.info = info
+        try:
+            return self.iterative_deepening(board, max_depth, time_limit, node_limit)
+        finally:
+            self.info = None
+            self.pondering = False
+            self.ponder_hit_time = None
+    
+    def book_move(self, board):
+        # Known opening line: the front ends play this move without calling search()
+        if self.book is None:
+            return None
+        return self.book.probe(board)
+    
+    def start_pondering(self, time_limit=None):
+        # Call before starting the search on the expected position (on the thread that will
+        # call ponderhit), the search then ignores its time limit until ponderhit()
+        self.pondering = True
+        self.ponder_time_limit = time_limit
+        self.ponder_hit_time = None
+    
+    def ponderhit(self):
+        # The expected move was played: the ponder search goes on as the real search, with
+        # everything it built so far, and its clock starts now
+        with self.ponder_lock:
+            self.pondering = False
+            self.search_start = self.ponder_hit_time = time.monotonic()
+            if self.ponder_time_limit is not None:
+                self.stop_time = self.search_start + self.ponder_time_limit
+                if self.completed_depth > 0:
+                    self.deadline = self.stop_time
+    
+    def stop(self):
+        # May be called from another thread while the search runs. Front ends that may call it
+        # before the search has started pass their own stop_request to search() and set that.
+        self.stop_request.set()
+    
+    def iterative_deepening(self, board, max_depth, time_limit=None, node_limit=None):
+        # Search depth 1, 2, 3 ... until max_depth or until the budget runs out.
+        # Every iteration starts with the previous principal variation, so the shallow
+        # searches make the deeper ones cheaper, and there is always a finished move to play.
+        self.tt.new_search()
+        self.nodes = 0
+        self.qnodes = 0
+        self.evals = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tb_hits = 0
+        self.hash_file_hits = 0
+        self.hash_file = self.open_search_hash_file()
+        self.pawn_cache.reset_stats()
+        self.material_cache.reset_stats()
+        self.null_cutoffs = 0
+        self.lmr_reductions = 0
+        self.researches = 0
+        self.quiet_generations = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for color_history in self.history: #older cutoffs count for less
+            for index, score in enumerate(color_history):
+                color_history[index] = score // 2
+        self.pv_moves = {}
+        self.principal_variation = []
+        self.completed_depth = 0
+        self.deadline = None
+        start = time.monotonic()
+        with self.ponder_lock:
+            if self.pondering:
+                self.search_start = start
+                self.stop_time = None #no clock until ponderhit()
+            else:
+                # A ponderhit() before this point already started the clock, it counts from there
+                self.search_start = self.ponder_hit_time or start
+                self.stop_time = self.search_start + time_limit if time_limit is not None else None
+            self.ponder_hit_time = None
+        
+        # Tablebase position: the tables know the best move, nothing to search
+        root = self.tablebase_root(board)
+        if root is not None:
+            score, move = root
+            self.completed_depth = 1
+            self.principal_variation = [move]
+            if self.info is not None:
+                elapsed = time.monotonic() - start
+                self.info({"depth": 1, "score": score, "nodes": 0, "time": elapsed, "nps": 0, "pv": [move]})
+            return score, move
+        
+        # Searched this deep before, by this or another process: play it right away
+        root = self.hash_file_root(board, max_depth)
+        if root is not None:
+            score, move, depth = root
+            self.completed_depth = depth
+            self.principal_variation = [move]
+            if self.info is not None:
+                elapsed = time.monotonic() - start
+                self.info({"depth": depth, "score": score, "nodes": 0, "time": elapsed, "nps": 0, "pv": [move]})
+            return score, move
+        
+        best_score, best_move = 0, None
+        for depth in range(1, max_depth + 1):
+            # Depth 1 always finishes, so we never come back without a move
+            if depth > 1:
+                self.deadline = self.stop_time
+                self.active_node_limit = node_limit
+            try:
+                score, move, pv = self.search_root(board, depth)
+            except SearchTimeout:
+                break
+            finally:
+                self.deadline = None
+                self.active_node_limit = None
+            
+            if move is None: #game is already over
+                break
+            best_score, best_move = score, move
+            self.completed_depth = depth
+            self.principal_variation = pv
+            if self.hash_file is not None and depth >= HASH_FILE_MIN_DEPTH:
+                # The parallel search never stores the root itself
+                self.hash_file.store(chess.polyglot.zobrist_hash(board), depth, score, TT_EXACT, move)
+            self.pv_moves = self.pv_key_moves(board, self.principal_variation)
+            
+            if self.info is not None:
+                elapsed = time.monotonic() - start
+                self.info({
+                    "depth": depth,
+                    "score": score,
+                    "nodes": self.nodes,
+                    "time": elapsed,
+                    "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+                    "pv": pv,
+                })
+            
+            # A forced mate will not change with more depth
+            if abs(score) >= 10000:
+                break
+            
+            # The next iteration takes several times longer, don't start what can't finish
+            stop_time = self.stop_time
+            search_start = self.search_start
+            if stop_time is not None and time.monotonic() - search_start > (stop_time - search_start) / 2:
+                break
+            if node_limit is not None and self.nodes >= node_limit:
+                break
+            if self.stop_request.is_set():
+                break
+        
+        return best_score, best_move
+    
+    def search_root(self, board, depth):
+        # One iteration, on this thread or split over the process pool
+        if self.workers > 1:
+            return self.parallel_search(board, depth)
+        
+        # An aborted search leaves moves pushed, so every iteration gets its own copy
+        self.init_stacks(board)
+        score, move = self.minimax(board.copy(), depth, -math.inf, math.inf, board.turn == chess.WHITE)
+        return score, move, self.extract_pv(board, depth)
+    
+    def search_options(self):
+        # Settings the worker processes copy before every task
+        return {
+            "use_move_ordering": self.use_move_ordering,
+            "use_quiescence": self.use_quiescence,
+            "use_pvs": self.use_pvs,
+            "use_null_move": self.use_null_move,
+            "use_lmr": self.use_lmr,
+            "use_staged_movegen": self.use_staged_movegen,
+            "max_qdepth": self.max_qdepth,
+            "debug_eval": self.debug_eval,
+            "tablebase_path": self.tablebase_path,
+            "tb_max_pieces": self.tb_max_pieces,
+            "hash_file_path": self.hash_file_path,
+            "use_eval_cache": self.use_eval_cache,
+        }
+    
+    def get_search_pool(self):
+        if self.search_pool is None or self.search_pool_size != self.workers:
+            self.shutdown_search_pool()
+            # Spawned (not forked) workers, a fork of the running Tk process is not safe
+            context = multiprocessing.get_context("spawn")
+            self.shared_best = context.Value("d", -math.inf)
+            self.pool_stop = context.Event()
+            self.search_pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_search_worker,
+                initargs=(self.shared_best, self.pool_stop)
+            )
+            self.search_pool_size = self.workers
+        return self.search_pool
+    
+    def shutdown_search_pool(self):
+        if self.search_pool is not None:
+            self.pool_stop.set()
+            self.search_pool.shutdown(wait=False, cancel_futures=True)
+            self.search_pool = None
+            self.search_pool_size = 0
+    
+    def parallel_search(self, board, depth):
+        # Root splitting: every root move is searched as its own task in the pool. The expected
+        # best move goes first and alone, its score is then shared as the bound for all others.
+        pool = self.get_search_pool()
+        pv = self.principal_variation
+        moves = self.order_moves(board, 0, pv[0] if pv else None)
+        if not moves:
+            return self.evaluate_position(board), None, []
+        
+        root_fen = board.root().fen()
+        history = [move.uci() for move in board.move_stack] #keeps repetitions visible to the workers
+        time_left = max(self.deadline - time.monotonic(), 0.0) if self.deadline is not None else None
+        node_limit = self.active_node_limit - self.nodes if self.active_node_limit is not None else None
+        options = self.search_options()
+        self.shared_best.value = -math.inf
+        
+        def submit(move):
+            line = [pv_move.uci() for pv_move in pv[1:]] if pv and move == pv[0] else []
+            return pool.submit(
+                _search_root_move, root_fen, history, move.uci(), depth, line,
+                time_left, node_limit, self.tt.generation, options
+            )
+        
+        results = self.collect_results({submit(moves[0]): 0})
+        results.update(self.collect_results({submit(move): index for index, move in enumerate(moves[1:], 1)}))
+        
+        # Merge in move order, so equal scores always resolve to the same move
+        is_maximizing = board.turn == chess.WHITE
+        best_index = None
+        for index in range(len(moves)):
+            score = results[index][0]
+            if best_index is None or (score > results[best_index][0] if is_maximizing else score < results[best_index][0]):
+                best_index = index
+        
+        score, line = results[best_index]
+        return score, moves[best_index], [moves[best_index]] + [chess.Move.from_uci(uci) for uci in line]
+    
+    def collect_results(self, futures):
+        # Wait for the tasks while watching our own stop flag
+        results = {}
+        pending = set(futures)
+        timed_out = False
+        try:
+            while pending:
+                if self.stop_event.is_set():
+                    raise SearchAborted()
+                if self.deadline is not None and time.monotonic() >= self.deadline:
+                    raise SearchTimeout()
+                if self.stop_request.is_set() and self.completed_depth > 0:
+                    raise SearchTimeout()
+                done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                for future in done:
+                    score, nodes, line = future.result()
+                    self.nodes += nodes
+                    if score is None:
+                        timed_out = True
+                    results[futures[future]] = (score, line)
+                if timed_out:
+                    raise SearchTimeout()
+        finally:
+            if pending:
+                # Stop the tasks that are still running and wait for them to notice
+                self.pool_stop.set()
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+                self.pool_stop.clear()
+        return results
+    
+    def extract_pv(self, board, depth):
+        # Follow the best moves stored in the transposition table from the root
+        pv = []
+        board = board.copy(stack=False)
+        seen = set()
+        while len(pv) < depth:
+            key = chess.polyglot.zobrist_hash(board)
+            if key in seen:
+                break
+            seen.add(key)
+            entry = self.tt.peek(key)
+            if entry is None or entry[4] is None or not board.is_legal(entry[4]):
+                break
+            pv.append(entry[4])
+            board.push(entry[4])
+        return pv
+    
+    def pv_key_moves(self, board, pv):
+        board = board.copy(stack=False)
+        pv_moves = {}
+        for move in pv:
+            pv_moves[chess.polyglot.zobrist_hash(board)] = move
+            board.push(move)
+        return pv_moves
+    
+    def count_node(self):
+        # Every searched position goes through here, this is where the search gets stopped
+        self.nodes += 1
+        if self.stop_event.is_set():
+            raise SearchAborted()
+        if self.stop_request.is_set() and self.completed_depth > 0: #depth 1 always finishes
+            raise SearchTimeout()
+        if self.deadline is not None and self.nodes & 255 == 0 and time.monotonic() >= self.deadline:
+            raise SearchTimeout()
+        if self.active_node_limit is not None and self.nodes >= self.active_node_limit:
+            raise SearchTimeout()
+    
+    def rule_ending(self, board):
+        # Game endings that don't need the move list: insufficient material, the 75-move rule
+        # and fivefold repetition. Returns the score, or None while the game goes on.
+        # Mate and stalemate are found by the search itself from the moves it generates.
+        if board.is_insufficient_material():
+            return 0
+        
+        halfmove_clock = board.halfmove_clock
+        if halfmove_clock >= REPETITION_PLIES and (halfmove_clock >= 150 or self.repetitions(halfmove_clock) >= 5):
+            # With no legal move left, mate or stalemate takes precedence
+            if halfmove_clock < 150 or self.has_legal_move(board):
+                # Forced draws, nothing left to play for
+                return 0
+        return None
+    
+    def repetitions(self, halfmove_clock):
+        # How often the current position occurred, looking back only to the last irreversible move
+        keys = self.keys
+        key = keys[-1]
+        count = 1
+        stop = max(len(keys) - 1 - halfmove_clock, 0)
+        for index in range(len(keys) - 3, stop - 1, -2):
+            if keys[index] == key:
+                count += 1
+        return count
+    
+    def has_legal_move(self, board):
+        return any(board.generate_legal_moves())
+    
+    def tablebase_wdl(self, board):
+        # Win (2) / cursed win (1) / draw (0) / blessed loss (-1) / loss (-2) for the side to move,
+        # None when the position is not in the tables
+        if self.tablebase_path is None or board.castling_rights:
+            return None
+        pieces = chess.popcount(board.occupied)
+        if pieces > self.tb_max_pieces or pieces > max_pieces(self.tablebase_path): #no probes for tables the directory doesn't have
+            return None
+        try:
+            wdl = open_tablebase(self.tablebase_path).probe_wdl(board)
+        except KeyError: #table file not in the directory
+            return None
+        self.tb_hits += 1
+        return wdl
+    
+    def tablebase_score(self, board, wdl, ply):
+        # Search score for a WDL value. Cursed wins and blessed losses are drawn by the
+        # 50-move rule; quicker wins score higher, like the mate scores.
+        if wdl == 2:
+            score = TB_WIN - ply
+        elif wdl == -2:
+            score = -TB_WIN + ply
+        else:
+            score = 0
+        return score if board.turn == chess.WHITE else -score
+    
+    def tablebase_root(self, board):
+        # Perfect move from the tables: best WDL first, then the DTZ of the reply, so wins are
+        # converted quickly and lost positions held as long as possible. Returns (score, move) or None.
+        if self.tablebase_wdl(board) is None:
+            return None
+        tablebase = open_tablebase(self.tablebase_path)
+        best = None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                # After our move the opponent is to move, so their loss (negative DTZ) close to 0 is best
+                rank = (-tablebase.probe_wdl(board), tablebase.probe_dtz(board))
+            except KeyError:
+                return None
+            finally:
+                board.pop()
+            if best is None or rank > best[0]:
+                best = (rank, move)
+        if best is None:
+            return None
+        (wdl, _), move = best
+        return self.tablebase_score(board, wdl, 1), move
+    
+    def hash_file_key(self):
+        # Everything besides position and depth the stored scores depend on, kept in the file header
+        settings = (EVAL_VERSION, self.piece_values, self.piece_tables, self.king_endgame_table,
+                    self.use_quiescence, self.max_qdepth, self.use_null_move, self.use_lmr, self.use_pvs,
+                    self.tablebase_path, self.tb_max_pieces)
+        return zlib.crc32(repr(settings).encode())
+    
+    def open_search_hash_file(self):
+        # A file made with other tables or settings is left alone, the search goes without it
+        if self.hash_file_path is None:
+            return None
+        try:
+            return open_hash_file(self.hash_file_path, self.hash_file_key())
+        except (OSError, ValueError):
+            return None
+    
+    def hash_file_root(self, board, max_depth):
+        # Exact result of at least max_depth for the root in the hash file: (score, move, depth) or None
+        hash_file = self.open_search_hash_file()
+        if hash_file is None:
+            return None
+        entry = hash_file.probe(chess.polyglot.zobrist_hash(board))
+        if entry is None:
+            return None
+        _, depth, score, bound, move, _ = entry
+        if depth < max_depth or bound != TT_EXACT or move is None or not board.is_legal(move):
+            return None
+        self.hash_file_hits += 1
+        return score, move, depth
+    
+    def minimax(self, board, depth, alpha, beta, is_maximizing, ply=0):
+        self.count_node()
+        
+        # Return evaluation if the game is over
+        ending = self.rule_ending(board)
+        if ending is not None:
+            return ending, None
+        
+        # Few pieces left: the tablebases know the exact result, no need to search further
+        if ply > 0:
+            wdl = self.tablebase_wdl(board)
+            if wdl is not None:
+                return self.tablebase_score(board, wdl, ply), None
+        
+        # At max depth, play out the captures first so we don't stop in the middle of an exchange
+        if depth == 0:
+            if self.use_quiescence:
+                return self.quiescence(board, alpha, beta, is_maximizing, 0), None
+            return self.evaluate_leaf(board), None
+        
+        # Look the position up in the transposition table
+        key = self.keys[-1]
+        alpha_orig, beta_orig = alpha, beta
+        hash_move = None
+        entry = self.tt.probe(key)
+        if entry is None and self.hash_file is not None and depth >= HASH_FILE_MIN_DEPTH:
+            # Not in memory, maybe another process or an earlier run searched it
+            entry = self.hash_file.probe(key)
+            if entry is not None:
+                self.hash_file_hits += 1
+                self.tt.store(*entry[:5])
+        if entry is not None:
+            _, entry_depth, entry_score, entry_bound, hash_move, _ = entry
+            entry_score = score_from_tt(entry_score, ply)
+            # Never cut at the root, we always want a real move from there
+            if ply > 0 and entry_depth >= depth:
+                if entry_bound == TT_EXACT:
+                    return entry_score, hash_move
+                elif entry_bound == TT_LOWER:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if beta <= alpha:
+                    return entry_score, hash_move
+        
+        # Null move: if the opponent can't get below beta (above alpha) even after we pass,
+        # a real move will do at least as well
+        in_check = board.is_check()
+        if self.null_move_allowed(board, depth, ply, in_check):
+            score = self.null_move_score(board, depth, alpha, beta, is_maximizing, ply)
+            if (score >= beta) if is_maximizing else (score <= alpha):
+                self.null_cutoffs += 1
+                return score, None
+        
+        # Principal variation of the previous iteration comes first
+        hash_move = self.pv_moves.get(key, hash_move)
+        
+        if self.use_staged_movegen and self.use_move_ordering:
+            moves = self.staged_moves(board, ply, hash_move) #generated as the loop asks for them
+        else:
+            moves = self.order_moves(board, ply, hash_move)
+        
+        best_move = None
+        
+        if is_maximizing:
+            best_eval = -math.inf
+            for index, move in enumerate(moves):
+                reduction = self.late_move_reduction(board, move, depth, index, in_check)
+                self.push_move(board, move)
+                if index == 0:
+                    eval_score, _ = self.minimax(board, depth - 1, alpha, beta, False, ply + 1)
+                else:
+                    eval_score = self.search_later_move(board, depth, alpha, beta, False, ply, reduction)
+                self.pop_move(board)
+                
+                if eval_score > best_eval:
+                    best_eval = eval_score
+                    best_move = move
+                
+                alpha = max(alpha, eval_score)
+                if beta <= alpha:
+                    self.record_cutoff(board, move, depth, ply, index)
+                    break
+        else:
+            best_eval = math.inf
+            for index, move in enumerate(moves):
+                reduction = self.late_move_reduction(board, move, depth, index, in_check)
+                self.push_move(board, move)
+                if index == 0:
+                    eval_score, _ = self.minimax(board, depth - 1, alpha, beta, True, ply + 1)
+                else:
+                    eval_score = self.search_later_move(board, depth, alpha, beta, True, ply, reduction)
+                self.pop_move(board)
+                
+                if eval_score < best_eval:
+                    best_eval = eval_score
+                    best_move = move
+                
+                beta = min(beta, eval_score)
+                if beta <= alpha:
+                    self.record_cutoff(board, move, depth, ply, index)
+                    break
+        
+        # No legal moves: checkmate or stalemate
+        if best_move is None:
+            if in_check:
+                return (-10000 if board.turn == chess.WHITE else 10000), None
+            return 0, None
+        
+        # Store the result, the bound type says how far the score can be trusted
+        if best_eval <= alpha_orig:
+            bound = TT_UPPER
+        elif best_eval >= beta_orig:
+            bound = TT_LOWER
+        else:
+            bound = TT_EXACT
+        tt_score = score_to_tt(best_eval, ply)
+        self.tt.store(key, depth, tt_score, bound, best_move)
+        if self.hash_file is not None and depth >= HASH_FILE_MIN_DEPTH:
+            self.hash_file.store(key, depth, tt_score, bound, best_move)
+        
+        return best_eval, best_move
+    
+    def search_later_move(self, board, depth, alpha, beta, child_maximizing, ply, reduction):
+        # Every move after the first (already pushed): first only ask whether it beats the best
+        # so far, with a null window (PVS) and/or a reduced depth (LMR). Only a move that does
+        # gets the full search.
+        if self.use_pvs:
+            if child_maximizing and beta != math.inf:
+                window = (beta - 1, beta)
+            elif not child_maximizing and alpha != -math.inf:
+                window = (alpha, alpha + 1)
+            else:
+                window = (alpha, beta)
+        else:
+            window = (alpha, beta)
+        if window == (alpha, beta) and not reduction:
+            return self.minimax(board, depth - 1, alpha, beta, child_maximizing, ply + 1)[0]
+        
+        score, _ = self.minimax(board, depth - 1 - reduction, window[0], window[1], child_maximizing, ply + 1)
+        improves = score < beta if child_maximizing else score > alpha
+        if reduction and improves:
+            # The reduced search says this move is better after all, look at it with full depth
+            self.researches += 1
+            score, _ = self.minimax(board, depth - 1, window[0], window[1], child_maximizing, ply + 1)
+        if window != (alpha, beta) and alpha < score < beta:
+            # Beats the best move, the null window only told us that much: get the real score
+            self.researches += 1
+            score, _ = self.minimax(board, depth - 1, alpha, beta, child_maximizing, ply + 1)
+        return score
+    
+    def null_move_allowed(self, board, depth, ply, in_check):
+        # Zugzwang guards: never in check, never twice in a row, never with only king and pawns
+        # (where passing would often be the best move). Also needs a static eval that is
+        # already at or beyond the bound, otherwise the null move rarely cuts.
+        if not self.use_null_move or ply == 0 or in_check or depth <= NULL_MOVE_REDUCTION:
+            return False
+        if board.move_stack and board.move_stack[-1] == chess.Move.null():
+            return False
+        return bool(board.occupied_co[board.turn] & ~(board.pawns | board.kings))
+    
+    def null_move_score(self, board, depth, alpha, beta, is_maximizing, ply):
+        # Let the opponent move twice, with a null window at the bound we want to cut at
+        static = self.eval_stack[-1]
+        if (static < beta) if is_maximizing else (static > alpha):
+            return static #can't cut, don't spend the search
+        self.push_null_move(board)
+        try:
+            if is_maximizing:
+                score, _ = self.minimax(board, depth - 1 - NULL_MOVE_REDUCTION, beta - 1, beta, False, ply + 1)
+            else:
+                score, _ = self.minimax(board, depth - 1 - NULL_MOVE_REDUCTION, alpha, alpha + 1, True, ply + 1)
+        finally:
+            self.pop_move(board)
+        return score
+    
+    def late_move_reduction(self, board, move, depth, index, in_check):
+        # Quiet moves far down the ordered list rarely turn out best, they get a shallower
+        # search first. Captures, promotions, checks and check evasions are never reduced.
+        if not self.use_lmr or depth < LMR_MIN_DEPTH or index < LMR_MIN_INDEX or in_check:
+            return 0
+        if move.promotion or board.is_capture(move) or board.gives_check(move):
+            return 0
+        self.lmr_reductions += 1
+        return 2 if depth >= 6 and index >= 12 else 1
+    
+    def quiescence(self, board, alpha, beta, is_maximizing, qdepth):
+        # Captures and queen promotions only, until the position is quiet
+        self.count_node()
+        self.qnodes += 1
+        
+        if board.is_check():
+            # No standing pat in check, every evasion has to be looked at
+            moves = self.order_moves(board, MAX_PLY, None)
+            if not moves:
+                return -10000 if board.turn == chess.WHITE else 10000
+            if qdepth >= self.max_qdepth:
+                return 0 if board.is_insufficient_material() else self.static_eval(board)
+            stand_pat = None
+        else:
+            # Stand pat: the side to move can always decline to capture
+            if board.is_insufficient_material() or not self.has_legal_move(board):
+                stand_pat = 0
+            else:
+                stand_pat = self.static_eval(board)
+            if qdepth >= self.max_qdepth:
+                return stand_pat
+            if is_maximizing:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+            moves = self.capture_moves(board)
+        
+        values = self.piece_values
+        best_eval = stand_pat if stand_pat is not None else (-math.inf if is_maximizing else math.inf)
+        for move in moves:
+            if stand_pat is not None:
+                victim = board.piece_type_at(move.to_square) or (chess.PAWN if board.is_en_passant(move) else None)
+                gain = (values[victim] if victim else 0) + (values[move.promotion] - values[chess.PAWN] if move.promotion else 0)
+                
+                # Delta pruning: even winning this piece for free would not reach the window
+                if is_maximizing and stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+                if not is_maximizing and stand_pat - gain - DELTA_MARGIN >= beta:
+                    continue
+                
+                # Losing captures (static exchange below zero) are not worth a look
+                if victim and not move.promotion and values[board.piece_type_at(move.from_square)] > values[victim] and self.see(board, move) < 0:
+                    continue
+            
+            self.push_move(board, move)
+            eval_score = self.quiescence(board, alpha, beta, not is_maximizing, qdepth + 1)
+            self.pop_move(board)
+            
+            if is_maximizing:
+                best_eval = max(best_eval, eval_score)
+                alpha = max(alpha, eval_score)
+            else:
+                best_eval = min(best_eval, eval_score)
+                beta = min(beta, eval_score)
+            if beta <= alpha:
+                break
+        
+        return best_eval
+    
+    def capture_moves(self, board):
+        # Captures (MVV-LVA order) and queen promotions for the quiescence search
+        values = self.piece_values
+        scored = []
+        for move in board.generate_legal_captures():
+            if move.promotion and move.promotion != chess.QUEEN:
+                continue
+            victim = board.piece_type_at(move.to_square) or chess.PAWN #no piece there = en passant
+            scored.append((10 * values[victim] - values[board.piece_type_at(move.from_square)], move))
+        
+        promotion_rank = chess.BB_RANK_7 if board.turn == chess.WHITE else chess.BB_RANK_2
+        pawns = board.pawns & board.occupied_co[board.turn] & promotion_rank
+        if pawns:
+            for move in board.generate_legal_moves(from_mask=pawns, to_mask=~board.occupied):
+                if move.promotion == chess.QUEEN:
+                    scored.append((values[chess.QUEEN], move))
+        
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+    
+    def see(self, board, move):
+        # Static exchange evaluation: material won or lost (for the side to move) if both
+        # sides keep recapturing on the target square with their least valuable piece
+        values = self.piece_values
+        target = move.to_square
+        occupied = board.occupied & ~chess.BB_SQUARES[move.from_square]
+        
+        victim = board.piece_type_at(target)
+        if victim is None: #en passant
+            victim = chess.PAWN
+            occupied &= ~chess.BB_SQUARES[chess.square(chess.square_file(target), chess.square_rank(move.from_square))]
+        
+        gains = [values[victim]]
+        on_square = board.piece_type_at(move.from_square) #piece that can be captured next
+        color = not board.turn
+        while True:
+            attackers = self.attackers_through(board, target, occupied) & board.occupied_co[color] & occupied
+            if not attackers:
+                break
+            for piece_type in chess.PIECE_TYPES:
+                pieces = attackers & board.pieces_mask(piece_type, color)
+                if pieces:
+                    square = chess.lsb(pieces)
+                    break
+            gains.append(values[on_square] - gains[-1])
+            on_square = piece_type
+            occupied &= ~chess.BB_SQUARES[square] #may uncover a slider behind it
+            color = not color
+        
+        # Each side only continues the exchange while it pays off
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+    
+    def attackers_through(self, board, square, occupied):
+        # Pieces of both colors attacking the square when only `occupied` blocks sliders
+        queens_and_rooks = board.queens | board.rooks
+        queens_and_bishops = board.queens | board.bishops
+        return (
+            (chess.BB_KING_ATTACKS[square] & board.kings) |
+            (chess.BB_KNIGHT_ATTACKS[square] & board.knights) |
+            (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] & queens_and_rooks) |
+            (chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied] & queens_and_rooks) |
+            (chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & queens_and_bishops) |
+            (chess.BB_PAWN_ATTACKS[chess.WHITE][square] & board.pawns & board.occupied_co[chess.BLACK]) |
+            (chess.BB_PAWN_ATTACKS[chess.BLACK][square] & board.pawns & board.occupied_co[chess.WHITE])
+        )
+    
+    def staged_moves(self, board, ply, hash_move):
+        # Same order as order_moves, but in stages: a cut-node that fails high on the hash move
+        # or a capture never generates (or legality-checks) its quiet moves. Only legal moves
+        # come out; the pseudo-legal ones are checked one at a time when their turn comes.
+        if hash_move is not None and board.is_legal(hash_move):
+            yield hash_move
+        else:
+            hash_move = None
+        
+        for move in self.ordered_captures(board):
+            if move != hash_move:
+                yield move
+        
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        tried = [hash_move]
+        for killer in killers:
+            # Killers come from other positions at this ply, they may not even be possible here
+            if killer is not None and killer not in tried and board.is_pseudo_legal(killer) \
+                    and not board.is_capture(killer) and not board.is_into_check(killer):
+                tried.append(killer)
+                yield killer
+        
+        self.quiet_generations += 1
+        for move in self.ordered_quiets(board):
+            if move not in tried and not board.is_into_check(move):
+                yield move
+    
+    def ordered_captures(self, board):
+        # Legal captures (capture promotions included), most valuable victim first
+        values = self.piece_values
+        scored = []
+        for move in board.generate_legal_captures():
+            victim = board.piece_type_at(move.to_square) or chess.PAWN #no piece there = en passant
+            scored.append((10 * values[victim] - values[board.piece_type_at(move.from_square)], move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+    
+    def ordered_quiets(self, board):
+        # Pseudo-legal non-captures: promotions first, then by history score. Castling is
+        # generated towards the own rook, so only squares of enemy pieces are masked out.
+        values = self.piece_values
+        history = self.history[board.turn]
+        ep_square = board.ep_square
+        scored = []
+        for move in board.generate_pseudo_legal_moves(chess.BB_ALL, chess.BB_ALL & ~board.occupied_co[not board.turn]):
+            if move.to_square == ep_square and board.is_en_passant(move):
+                continue
+            if move.promotion:
+                score = ORDER_PROMOTION + values[move.promotion]
+            else:
+                score = history[move.from_square * 64 + move.to_square]
+            scored.append((score, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+    
+    def order_moves(self, board, ply, hash_move):
+        # Hash/PV move, then captures by MVV-LVA, promotions, killer moves and
+        # finally quiet moves by how often they caused cutoffs (history heuristic)
+        if not self.use_move_ordering:
+            moves = list(board.legal_moves)
+            if hash_move in moves:
+                moves.remove(hash_move)
+                moves.insert(0, hash_move)
+            return moves
+        
+        values = self.piece_values
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history[board.turn]
+        ep_square = board.ep_square
+        
+        scored = []
+        for move in board.legal_moves:
+            if move == hash_move:
+                score = ORDER_HASH_MOVE
+            else:
+                victim = board.piece_type_at(move.to_square)
+                attacker = board.piece_type_at(move.from_square)
+                if victim is None and attacker == chess.PAWN and move.to_square == ep_square:
+                    victim = chess.PAWN
+                
+                if victim is not None:
+                    # Most valuable victim first, least valuable attacker breaks ties
+                    score = ORDER_CAPTURE + 10 * values[victim] - values[attacker]
+                elif move.promotion:
+                    score = ORDER_PROMOTION + values[move.promotion]
+                elif move == killers[0]:
+                    score = ORDER_KILLER + 1
+                elif move == killers[1]:
+                    score = ORDER_KILLER
+                else:
+                    score = history[move.from_square * 64 + move.to_square]
+            scored.append((score, move))
+        
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+    
+    def record_cutoff(self, board, move, depth, ply, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        
+        # Only quiet moves go to the killer and history tables, captures are ordered anyway
+        if move.promotion or board.is_capture(move):
+            return
+        
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        
+        history = self.history[board.turn]
+        slot = move.from_square * 64 + move.to_square
+        history[slot] += depth * depth
+        if history[slot] > HISTORY_LIMIT:
+            for color_history in self.history:
+                for i, score in enumerate(color_history):
+                    color_history[i] = score // 2
+    
+    def search_stats(self):
+        return {
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "evals": self.evals,
+            "depth": self.completed_depth,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            "tb_hits": self.tb_hits,
+            "hash_file_hits": self.hash_file_hits,
+            "pawn_hash_hit_rate": self.pawn_cache.hit_rate(),
+            "material_hit_rate": self.material_cache.hit_rate(),
+            "null_cutoffs": self.null_cutoffs,
+            "lmr_reductions": self.lmr_reductions,
+            "researches": self.researches,
+            "quiet_generations": self.quiet_generations,
+        }
+    
+    # Basic piece values
+    piece_values = {
+        chess.PAWN: 100,
+        chess.KNIGHT: 320,
+        chess.BISHOP: 330,
+        chess.ROOK: 500,
+        chess.QUEEN: 900,
+        chess.KING: 20000
+    }
+    
+    # Piece-square tables for position evaluation
+    pawn_table = [
+        0,  0,  0,  0,  0,  0,  0,  0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5,  5, 10, 25, 25, 10,  5,  5,
+        0,  0,  0, 20, 20,  0,  0,  0,
+        5, -5,-10,  0,  0,-10, -5,  5,
+        5, 10, 10,-20,-20, 10, 10,  5,
+        0,  0,  0,  0,  0,  0,  0,  0
+    ]
+    
+    knight_table = [
+        -50,-40,-30,-30,-30,-30,-40,-50,
+        -40,-20,  0,  0,  0,  0,-20,-40,
+        -30,  0, 10, 15, 15, 10,  0,-30,
+        -30,  5, 15, 20, 20, 15,  5,-30,
+        -30,  0, 15, 20, 20, 15,  0,-30,
+        -30,  5, 10, 15, 15, 10,  5,-30,
+        -40,-20,  0,  5,  5,  0,-20,-40,
+        -50,-40,-30,-30,-30,-30,-40,-50
+    ]
+    
+    bishop_table = [
+        -20,-10,-10,-10,-10,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0, 10, 10, 10, 10,  0,-10,
+        -10,  5,  5, 10, 10,  5,  5,-10,
+        -10,  0,  5, 10, 10,  5,  0,-10,
+        -10,  5,  5,  5,  5,  5,  5,-10,
+        -10,  0,  5,  0,  0,  5,  0,-10,
+        -20,-10,-10,-10,-10,-10,-10,-20
+    ]
+    
+    rook_table = [
+        0,  0,  0,  0,  0,  0,  0,  0,
+        5, 10, 10, 10, 10, 10, 10,  5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        0,  0,  0,  5,  5,  0,  0,  0
+    ]
+    
+    queen_table = [
+        -20,-10,-10, -5, -5,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0,  5,  5,  5,  5,  0,-10,
+        -5,  0,  5,  5,  5,  5,  0, -5,
+        0,  0,  5,  5,  5,  5,  0, -5,
+        -10,  5,  5,  5,  5,  5,  0,-10,
+        -10,  0,  5,  0,  0,  0,  0,-10,
+        -20,-10,-10, -5, -5,-10,-10,-20
+    ]
+    
+    king_table = [
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -20,-30,-30,-40,-40,-30,-30,-20,
+        -10,-20,-20,-20,-20,-20,-20,-10,
+        20, 20,  0,  0,  0,  0, 20, 20,
+        20, 30, 10,  0,  0, 10, 30, 20
+    ]
+    
+    # King in the endgame: walk to the center. The incremental score has king_table in it,
+    # evaluate_structure blends towards this one as the pieces come off.
+    king_endgame_table = [
+        -50,-30,-30,-30,-30,-30,-30,-50,
+        -30,-30,  0,  0,  0,  0,-30,-30,
+        -30,-10, 20, 30, 30, 20,-10,-30,
+        -30,-10, 30, 40, 40, 30,-10,-30,
+        -30,-10, 30, 40, 40, 30,-10,-30,
+        -30,-10, 20, 30, 30, 20,-10,-30,
+        -30,-30,  0,  0,  0,  0,-30,-30,
+        -50,-30,-30,-30,-30,-30,-30,-50
+    ]
+    
+    piece_tables = {
+        chess.PAWN: pawn_table,
+        chess.KNIGHT: knight_table,
+        chess.BISHOP: bishop_table,
+        chess.ROOK: rook_table,
+        chess.QUEEN: queen_table,
+        chess.KING: king_table
+    }
+    
+    def build_square_scores(self):
+        # scores[color][piece_type][square] = piece value + table value,
+        # positive for white and negative for black, black tables already mirrored
+        scores = [[None] * 7, [None] * 7] #indexed by chess.BLACK (0) / chess.WHITE (1)
+        for piece_type, piece_value in self.piece_values.items():
+            table = self.piece_tables.get(piece_type)
+            white = []
+            black = []
+            for square in chess.SQUARES:
+                white.append(piece_value + (table[square] if table else 0))
+                black.append(-(piece_value + (table[chess.square_mirror(square)] if table else 0)))
+            scores[chess.WHITE][piece_type] = white
+            scores[chess.BLACK][piece_type] = black
+        return scores
+    
+    def build_king_endgame_scores(self):
+        # scores[color][square] = king_endgame_table - king_table, positive for white, mirrored for black
+        king_table = self.piece_tables[chess.KING]
+        white = [self.king_endgame_table[square] - king_table[square] for square in chess.SQUARES]
+        black = [-white[chess.square_mirror(square)] for square in chess.SQUARES]
+        return [black, white]
+    
+    def move_delta(self, board, move):
+        # Change of the material + position score and of the piece placement Zobrist key
+        # caused by the move, board is before the push
+        scores = self.square_scores
+        keys = self.square_keys
+        color = board.turn
+        from_square = move.from_square
+        to_square = move.to_square
+        piece_type = board.piece_type_at(from_square)
+        own = scores[color]
+        own_keys = keys[color]
+        
+        # Moving piece (a promoted pawn arrives as the new piece)
+        delta = own[move.promotion or piece_type][to_square] - own[piece_type][from_square]
+        key_delta = own_keys[move.promotion or piece_type][to_square] ^ own_keys[piece_type][from_square]
+        
+        # Captured piece
+        captured = board.piece_type_at(to_square)
+        if captured:
+            delta -= scores[not color][captured][to_square]
+            key_delta ^= keys[not color][captured][to_square]
+        elif piece_type == chess.PAWN and to_square == board.ep_square:
+            # En passant, the captured pawn stands next to the target square
+            ep_pawn = chess.square(chess.square_file(to_square), chess.square_rank(from_square))
+            delta -= scores[not color][chess.PAWN][ep_pawn]
+            key_delta ^= keys[not color][chess.PAWN][ep_pawn]
+        
+        # Castling also moves the rook
+        if piece_type == chess.KING and abs(to_square - from_square) == 2:
+            rank = chess.square_rank(from_square)
+            if to_square > from_square:
+                rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+            else:
+                rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+            delta += own[chess.ROOK][rook_to] - own[chess.ROOK][rook_from]
+            key_delta ^= own_keys[chess.ROOK][rook_to] ^ own_keys[chess.ROOK][rook_from]
+        
+        return delta, key_delta
+    
+    def build_square_keys(self):
+        # Polyglot numbering: black pawn, white pawn, black knight, white knight, ...
+        array = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+        keys = [[None] * 7, [None] * 7]
+        for color in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                piece_index = (piece_type - 1) * 2 + int(color)
+                keys[color][piece_type] = [array[64 * piece_index + square] for square in chess.SQUARES]
+        return keys
+    
+    def init_stacks(self, board):
+        # Incremental evaluation and Zobrist keys for the root of a search. The keys of the
+        # positions since the last irreversible move are needed to spot repetitions.
+        self.eval_stack = [self.evaluate_material(board)]
+        self.piece_keys = [ZOBRIST.hash_board(board)]
+        
+        history = board.copy()
+        keys = [chess.polyglot.zobrist_hash(history)]
+        for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+            history.pop()
+            keys.append(chess.polyglot.zobrist_hash(history))
+        keys.reverse()
+        self.keys = keys
+    
+    def push_move(self, board, move):
+        # board.push that keeps the incremental evaluation and the Zobrist key in step
+        score_delta, key_delta = self.move_delta(board, move)
+        self.eval_stack.append(self.eval_stack[-1] + score_delta)
+        board.push(move)
+        
+        piece_key = self.piece_keys[-1] ^ key_delta
+        self.piece_keys.append(piece_key)
+        self.keys.append(self.position_key(board, piece_key))
+    
+    def push_null_move(self, board):
+        # Pass the move: same pieces, same score, only side to move and en passant change
+        board.push(chess.Move.null())
+        self.eval_stack.append(self.eval_stack[-1])
+        self.piece_keys.append(self.piece_keys[-1])
+        self.keys.append(self.position_key(board, self.piece_keys[-1]))
+    
+    def position_key(self, board, piece_key):
+        # Castling flags, en passant file and side to move are cheap to read after the push
+        castling_key = self.castling_keys.get(board.castling_rights)
+        if castling_key is None:
+            castling_key = self.castling_keys[board.castling_rights] = ZOBRIST.hash_castling(board)
+        key = piece_key ^ castling_key
+        if board.ep_square:
+            key ^= ZOBRIST.hash_ep_square(board)
+        if board.turn == chess.WHITE:
+            key ^= ZOBRIST_TURN
+        
+        if self.debug_eval and key != chess.polyglot.zobrist_hash(board):
+            raise AssertionError(f"Incremental key differs from zobrist_hash for {board.fen()}")
+        return key
+    
+    def pop_move(self, board):
+        board.pop()
+        self.eval_stack.pop()
+        self.piece_keys.pop()
+        self.keys.pop()
+    
+    def static_eval(self, board):
+        # Material + position score of the current search position, read from the incremental
+        # stack instead of scanning all 64 squares
+        self.evals += 1
+        value = self.eval_stack[-1]
+        if self.debug_eval:
+            full_value = self.evaluate_material(board)
+            if value != full_value:
+                raise AssertionError(f"Incremental eval {value} != full eval {full_value} for {board.fen()}")
+        return value + self.evaluate_structure(board)
+    
+    def evaluate_leaf(self, board):
+        # Same score as evaluate_position, with the static part from the incremental stack
+        if board.is_checkmate():
+            return -10000 if board.turn == chess.WHITE else 10000
+            
+        if board.is_stalemate() or board.is_insufficient_material():
+            return 0
+        
+        return self.static_eval(board)
+    
+    def evaluate_position(self, board):
+        if board.is_checkmate():
+            # Return a large negative value if the side to move is checkmated
+            return -10000 if board.turn == chess.WHITE else 10000
+            
+        if board.is_stalemate() or board.is_insufficient_material():
+            return 0
+        
+        return self.evaluate_material(board) + self.evaluate_structure(board)
+    
+    def evaluate_structure(self, board):
+        # Pawn structure, bishop pair and the king endgame table, tapered by the game phase.
+        # The pawn and material parts only change with their own keys, so they come from the caches.
+        phase, material_mg, material_eg = self.material_terms(board)
+        pawn_mg, pawn_eg = self.pawn_structure(board)
+        king_scores = self.king_endgame_scores
+        king_eg = king_scores[chess.WHITE][board.king(chess.WHITE)] + king_scores[chess.BLACK][board.king(chess.BLACK)]
+        middlegame = material_mg + pawn_mg
+        endgame = material_eg + pawn_eg + king_eg
+        return int((middlegame * phase + endgame * (MAX_PHASE - phase)) / MAX_PHASE) #rounds towards 0 for both colors
+    
+    def pawn_structure(self, board):
+        # (middlegame, endgame) score of doubled, isolated and passed pawns, white minus black
+        white_pawns = board.pawns & board.occupied_co[chess.WHITE]
+        black_pawns = board.pawns & board.occupied_co[chess.BLACK]
+        key = white_pawns | black_pawns << 64
+        if self.use_eval_cache:
+            cached = self.pawn_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        middlegame = endgame = 0
+        for color, own, enemy, sign in ((chess.WHITE, white_pawns, black_pawns, 1), (chess.BLACK, black_pawns, white_pawns, -1)):
+            for file in range(8):
+                count = chess.popcount(own & chess.BB_FILES[file])
+                if count == 0:
+                    continue
+                if count > 1:
+                    middlegame += sign * DOUBLED_PAWN[0] * (count - 1)
+                    endgame += sign * DOUBLED_PAWN[1] * (count - 1)
+                if not own & ADJACENT_FILES[file]:
+                    middlegame += sign * ISOLATED_PAWN[0] * count
+                    endgame += sign * ISOLATED_PAWN[1] * count
+            for square in chess.scan_forward(own):
+                if not enemy & PASSED_PAWN_MASKS[color][square]:
+                    rank = chess.square_rank(square) if color == chess.WHITE else 7 - chess.square_rank(square)
+                    middlegame += sign * PASSED_PAWN[0][rank]
+                    endgame += sign * PASSED_PAWN[1][rank]
+        
+        if self.use_eval_cache:
+            self.pawn_cache.put(key, (middlegame, endgame))
+        return middlegame, endgame
+    
+    def material_terms(self, board):
+        # (phase, middlegame, endgame) for the piece counts: the phase from the pieces left and
+        # the bishop pair bonus
+        white = board.occupied_co[chess.WHITE]
+        black = board.occupied_co[chess.BLACK]
+        knights, bishops, rooks, queens = board.knights, board.bishops, board.rooks, board.queens
+        key = (
+            (knights & white).bit_count(), (bishops & white).bit_count(),
+            (rooks & white).bit_count(), (queens & white).bit_count(),
+            (knights & black).bit_count(), (bishops & black).bit_count(),
+            (rooks & black).bit_count(), (queens & black).bit_count(),
+        )
+        if self.use_eval_cache:
+            cached = self.material_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        weights = list(PHASE_WEIGHTS.values()) * 2 #same order as the key: N, B, R, Q of white, then black
+        phase = min(MAX_PHASE, sum(weight * count for weight, count in zip(weights, key)))
+        middlegame = endgame = 0
+        if key[1] >= 2:
+            middlegame += BISHOP_PAIR[0]
+            endgame += BISHOP_PAIR[1]
+        if key[5] >= 2:
+            middlegame -= BISHOP_PAIR[0]
+            endgame -= BISHOP_PAIR[1]
+        terms = (phase, middlegame, endgame)
+        
+        if self.use_eval_cache:
+            self.material_cache.put(key, terms)
+        return terms
+    
+    def evaluate_material(self, board):
+        # Material and position evaluation
+        value = 0
+        
+        # Count material and position value
+        for square in chess.SQUARES:
+            piece = board.piece_at(square)
+            if piece:
+                # Basic piece value
+                piece_value = self.piece_values.get(piece.piece_type, 0)
+                
+                # Position value from piece-square tables
+                position_value = 0
+                piece_table = self.piece_tables.get(piece.piece_type)
+                if piece_table:
+                    # Get the square index (0-63) for the table lookup
+                    # Flip the table for black pieces
+                    square_idx = square
+                    if piece.color == chess.BLACK:
+                        square_idx = chess.square_mirror(square)
+                    position_value = piece_table[square_idx]
+                
+                # Add to total evaluation (positive for white, negative for black)
+                if piece.color == chess.WHITE:
+                    value += piece_value + position_value
+                else:
+                    value -= piece_value + position_value
+        
+        return value
+
+
+# Worker process side of the parallel search. Each process keeps one headless searcher
+# (with its own transposition table) for its whole life, so entries carry over between moves.
+_worker_searcher = None
+_worker_best = None
+
+def _init_search_worker(shared_best, stop_event):
+    global _worker_searcher, _worker_best
+    _worker_searcher = Engine()
+    _worker_searcher.stop_event = stop_event
+    _worker_best = shared_best
+
+def _search_root_move(root_fen, history, root_move, depth, pv, time_left, node_limit, generation, options):
+    searcher = _worker_searcher
+    searcher.__dict__.update(options)
+    searcher.hash_file = searcher.open_search_hash_file()
+    searcher.tt.generation = generation
+    
+    # Rebuild the position from the move stack so repetitions are still detected
+    board = chess.Board(root_fen)
+    for uci in history:
+        board.push_uci(uci)
+    root_white = board.turn == chess.WHITE
+    board.push_uci(root_move)
+    
+    # Shared best score is stored from the root side's point of view. The window is one point
+    # wider than needed, so a move that only ties the best gets an exact score too.
+    best = _worker_best.value
+    if root_white:
+        alpha, beta = best - 1, math.inf
+    else:
+        alpha, beta = -math.inf, -best + 1
+    
+    searcher.nodes = 0
+    searcher.deadline = time.monotonic() + time_left if time_left is not None else None
+    searcher.active_node_limit = node_limit #per task, so the total is only roughly limited
+    searcher.init_stacks(board)
+    searcher.pv_moves = searcher.pv_key_moves(board, [chess.Move.from_uci(uci) for uci in pv])
+    try:
+        score, _ = searcher.minimax(board, depth - 1, alpha, beta, not root_white, 1)
+    except SearchTimeout:
+        return None, searcher.nodes, []
+    finally:
+        searcher.deadline = None
+        searcher.active_node_limit = None
+    
+    root_score = score if root_white else -score
+    with _worker_best.get_lock():
+        if root_score > _worker_best.value:
+            _worker_best.value = root_score
+    
+    return score, searcher.nodes, [move.uci() for move in searcher.extract_pv(board, depth - 1)]
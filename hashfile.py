@@ -0,0 +1,140 @@
+import mmap
+import os
+import struct
+
+import chess
+
+# Search results on disk: a fixed-size hash file keyed by the same Zobrist key as the
+# transposition table, mapped into memory so every process that opens it (the game, the
+# parallel search workers, the server workers) reads and writes the same pages, and what one
+# of them found is still there on the next start.
+#
+# Layout: a 16 byte header (magic, bucket bits, evaluation key), then buckets of two 16 byte slots. Slot 0
+# keeps the deepest result, slot 1 the latest, like TranspositionTable.
+# Slot: (key ^ data, data) as two little-endian 64-bit words; data packs score, depth, bound
+# and best move. Nothing is locked: a reader only accepts a slot whose words xor to the key it
+# asked for, so a slot torn by two processes writing at once reads as empty instead of wrong.
+# Scores are only right for the evaluation that made them: the evaluation key (Engine.hash_file_key,
+# the evaluation version, tables, quiescence, pruning and tablebase settings) is kept in the header
+# and a file made with another one is refused.
+
+DEFAULT_HASH_FILE_PATH = "search.hash"
+DEFAULT_HASH_FILE_BITS = 16 #2^16 buckets of two slots, 2 MB
+HASH_FILE_MIN_DEPTH = 2 #shallower results are cheap to redo and would only crowd the file
+
+MAGIC = b"CHESSTT2" #file format version
+HEADER = struct.Struct("<8sII")
+SLOT = struct.Struct("<QQ")
+BUCKET_SIZE = 2 * SLOT.size
+SCORE_OFFSET = 1 << 31 #scores are stored unsigned
+
+_hash_files = {} #path -> open HashFile, one mapping per process
+
+def open_hash_file(path, eval_key, size_bits=DEFAULT_HASH_FILE_BITS):
+    hash_file = _hash_files.get(path)
+    if hash_file is None:
+        hash_file = _hash_files[path] = HashFile(path, eval_key, size_bits)
+    elif hash_file.eval_key != eval_key:
+        raise ValueError(f"{path} holds scores of another evaluation")
+    return hash_file
+
+def pack_move(move):
+    # from | to << 6 | promotion << 12, 0 = no move (a1a1 is never a move)
+    if move is None:
+        return 0
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+def unpack_move(value):
+    if value == 0:
+        return None
+    return chess.Move(value & 63, (value >> 6) & 63, (value >> 12) or None)
+
+class HashFile:
+    def __init__(self, path, eval_key, size_bits=DEFAULT_HASH_FILE_BITS):
+        self.path = path
+        if not os.path.exists(path):
+            self.create(path, eval_key, size_bits)
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, size_bits, self.eval_key = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or len(self.map) != HEADER.size + (BUCKET_SIZE << size_bits):
+            self.close()
+            raise ValueError(f"{path} is not a search hash file of this version")
+        if self.eval_key != eval_key:
+            self.close()
+            raise ValueError(f"{path} holds scores of another evaluation")
+        self.mask = (1 << size_bits) - 1 #the file's own size wins over the size_bits asked for
+
+        # Counters of this process
+        self.hits = 0
+        self.stores = 0
+
+    @staticmethod
+    def create(path, eval_key, size_bits):
+        # Built under a temporary name and linked into place, so another process starting at
+        # the same moment either finds no file or a complete one
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as new_file:
+            new_file.write(HEADER.pack(MAGIC, size_bits, eval_key))
+            new_file.truncate(HEADER.size + (BUCKET_SIZE << size_bits)) #sparse, reads as empty slots
+        try:
+            os.link(temporary, path)
+        except FileExistsError:
+            pass #the other process won, use its file
+        finally:
+            os.remove(temporary)
+
+    def read_slot(self, offset, key):
+        check, data = SLOT.unpack_from(self.map, offset)
+        if data and check ^ data == key:
+            return data
+        return None
+
+    def probe(self, key):
+        # (key, depth, score, bound, best_move, 0) like a TranspositionTable entry, or None
+        offset = HEADER.size + (key & self.mask) * BUCKET_SIZE
+        data = self.read_slot(offset, key)
+        if data is None:
+            data = self.read_slot(offset + SLOT.size, key)
+            if data is None:
+                return None
+        self.hits += 1
+        return (key, (data >> 32) & 255, (data & 0xFFFFFFFF) - SCORE_OFFSET, (data >> 40) & 3, unpack_move(data >> 42), 0)
+
+    def store(self, key, depth, score, bound, best_move):
+        data = (int(score) + SCORE_OFFSET) | min(depth, 255) << 32 | bound << 40 | pack_move(best_move) << 42
+        offset = HEADER.size + (key & self.mask) * BUCKET_SIZE
+        self.stores += 1
+
+        # Depth-preferred slot unless it holds a deeper result of another position
+        check, deep = SLOT.unpack_from(self.map, offset)
+        if deep and check ^ deep != key and (deep >> 32) & 255 > depth:
+            offset += SLOT.size
+        SLOT.pack_into(self.map, offset, key ^ data, data)
+
+    def entries(self):
+        # Every readable entry, for warming up a TranspositionTable
+        for offset in range(HEADER.size, len(self.map), SLOT.size):
+            check, data = SLOT.unpack_from(self.map, offset)
+            if data:
+                key = check ^ data
+                if (key & self.mask) == (offset - HEADER.size) // BUCKET_SIZE: #torn slots land elsewhere
+                    yield (key, (data >> 32) & 255, (data & 0xFFFFFFFF) - SCORE_OFFSET, (data >> 40) & 3, unpack_move(data >> 42))
+
+    def warm(self, tt):
+        # Copies the file into the in-memory table, returns how many entries it had
+        count = 0
+        for key, depth, score, bound, best_move in self.entries():
+            tt.store(key, depth, score, bound, best_move)
+            count += 1
+        tt.stores = 0
+        return count
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        if _hash_files.get(self.path) is self:
+            del _hash_files[self.path]
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,158 @@
+import json
+import time
+
+from engine import Engine
+
+# Search instrumentation. InstrumentedEngine wraps the hot methods of Engine with counters and
+# timers; the plain Engine has none of this code in it, so switching it off costs nothing.
+# Only the search in this process is measured, worker processes of the parallel search are not.
+
+class InstrumentedEngine(Engine):
+    def __init__(self, log_path=None):
+        super().__init__()
+        self.log_path = log_path
+
+    @classmethod
+    def from_engine(cls, engine, log_path=None):
+        # Same tables, settings and process pool, just measured from now on
+        instrumented = cls.__new__(cls)
+        instrumented.__dict__.update(engine.__dict__)
+        instrumented.log_path = log_path
+        return instrumented
+
+    def reset_instrumentation(self, board):
+        self.root_ply = len(board.move_stack)
+        self.seldepth = 0
+        self.cutoffs_by_ply = []
+        self.time_movegen = 0.0
+        self.time_eval = 0.0
+        self.time_game_over = 0.0
+        self.tt_hits_before = self.tt.hits
+        self.tt_probes_before = self.tt.hits + self.tt.misses
+        self.last_report = None
+
+    def iterative_deepening(self, board, max_depth, time_limit=None, node_limit=None):
+        self.reset_instrumentation(board)
+        start = time.perf_counter()
+        try:
+            return super().iterative_deepening(board, max_depth, time_limit, node_limit)
+        finally:
+            self.last_report = self.build_report(board, time.perf_counter() - start)
+            if self.log_path:
+                self.write_log(self.last_report)
+
+    def minimax(self, board, depth, alpha, beta, is_maximizing, ply=0):
+        reached = len(board.move_stack) - self.root_ply
+        if reached > self.seldepth:
+            self.seldepth = reached
+        return super().minimax(board, depth, alpha, beta, is_maximizing, ply)
+
+    def quiescence(self, board, alpha, beta, is_maximizing, qdepth):
+        reached = len(board.move_stack) - self.root_ply
+        if reached > self.seldepth:
+            self.seldepth = reached
+        return super().quiescence(board, alpha, beta, is_maximizing, qdepth)
+
+    def order_moves(self, board, ply, hash_move):
+        start = time.perf_counter()
+        moves = super().order_moves(board, ply, hash_move)
+        self.time_movegen += time.perf_counter() - start
+        return moves
+
+    def ordered_captures(self, board):
+        start = time.perf_counter()
+        moves = super().ordered_captures(board)
+        self.time_movegen += time.perf_counter() - start
+        return moves
+
+    def ordered_quiets(self, board):
+        start = time.perf_counter()
+        moves = super().ordered_quiets(board)
+        self.time_movegen += time.perf_counter() - start
+        return moves
+
+    def capture_moves(self, board):
+        start = time.perf_counter()
+        moves = super().capture_moves(board)
+        self.time_movegen += time.perf_counter() - start
+        return moves
+
+    def static_eval(self, board):
+        start = time.perf_counter()
+        value = super().static_eval(board)
+        self.time_eval += time.perf_counter() - start
+        return value
+
+    def evaluate_leaf(self, board):
+        # Only used with quiescence off, counted as a game-over check plus static_eval
+        start = time.perf_counter()
+        value = super().evaluate_leaf(board)
+        self.time_game_over += time.perf_counter() - start
+        return value
+
+    def rule_ending(self, board):
+        start = time.perf_counter()
+        ending = super().rule_ending(board)
+        self.time_game_over += time.perf_counter() - start
+        return ending
+
+    def has_legal_move(self, board):
+        start = time.perf_counter()
+        found = super().has_legal_move(board)
+        self.time_game_over += time.perf_counter() - start
+        return found
+
+    def record_cutoff(self, board, move, depth, ply, index):
+        while len(self.cutoffs_by_ply) <= ply:
+            self.cutoffs_by_ply.append(0)
+        self.cutoffs_by_ply[ply] += 1
+        super().record_cutoff(board, move, depth, ply, index)
+
+    def build_report(self, board, elapsed):
+        tt_probes = self.tt.hits + self.tt.misses - self.tt_probes_before
+        return {
+            "fen": board.fen(),
+            "depth": self.completed_depth,
+            "seldepth": self.seldepth,
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "evals": self.evals,
+            "cutoffs": self.cutoffs,
+            "cutoffs_by_ply": self.cutoffs_by_ply,
+            "null_cutoffs": self.null_cutoffs,
+            "lmr_reductions": self.lmr_reductions,
+            "researches": self.researches,
+            "quiet_generations": self.quiet_generations,
+            "first_move_cutoff_rate": round(self.first_move_cutoffs / self.cutoffs, 4) if self.cutoffs else 0.0,
+            "tt_hits": self.tt.hits - self.tt_hits_before,
+            "tt_probes": tt_probes,
+            "tb_hits": self.tb_hits,
+            "hash_file_hits": self.hash_file_hits,
+            "pawn_hash_hit_rate": round(self.pawn_cache.hit_rate(), 4),
+            "material_hit_rate": round(self.material_cache.hit_rate(), 4),
+            "time": round(elapsed, 4),
+            "time_movegen": round(self.time_movegen, 4),
+            "time_eval": round(self.time_eval, 4),
+            "time_game_over": round(self.time_game_over, 4),
+            "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+            "pv": [move.uci() for move in self.principal_variation],
+        }
+
+    def write_log(self, report):
+        # One JSON object per line, easy to grep and to load later
+        with open(self.log_path, "a") as log_file:
+            log_file.write(json.dumps(report) + "\n")
+
+def format_report(report):
+    # Short text for the side panel
+    total = report["time"] or 1.0
+    pv = " ".join(report["pv"][:6])
+    return (
+        f"Depth {report['depth']}/{report['seldepth']}  Nodes {report['nodes']}\n"
+        f"{report['nps']} nps  {report['time']:.2f}s\n"
+        f"TT hits {report['tt_hits']}/{report['tt_probes']}  "
+        f"Pawn hash {report['pawn_hash_hit_rate']:.0%}  Material {report['material_hit_rate']:.0%}\n"
+        f"Movegen {report['time_movegen'] / total:.0%}  Eval {report['time_eval'] / total:.0%}  "
+        f"Game over {report['time_game_over'] / total:.0%}\n"
+        f"PV {pv}"
+    )
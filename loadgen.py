@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+import chess
+
+from server import DEFAULT_PORT, percentiles
+
+# Load generator for server.py: a number of clients each play games against the server with
+# random moves, as fast as the replies come, and report move latencies, "busy" replies and
+# the server's own statistics at the end.
+#   python server.py --workers 4 &
+#   python loadgen.py --clients 16 --games 2 --plies 20 --difficulty 2 --time 0.5
+
+BUSY_RETRY_DELAY = 0.2 #seconds before a move turned away as busy is sent again
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.request_ids = itertools.count(1)
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, command, **fields):
+        # One request at a time per client, so the next line is the reply
+        request_id = next(self.request_ids)
+        self.writer.write((json.dumps({"id": request_id, "cmd": command, **fields}) + "\n").encode())
+        await self.writer.drain()
+        reply = json.loads(await self.reader.readline())
+        if reply.get("id") != request_id:
+            raise RuntimeError(f"reply to {reply.get('id')}, expected {request_id}")
+        return reply
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def play_games(client_number, args, results):
+    rng = random.Random(args.seed + client_number)
+    client = await Client.connect(args.host, args.port)
+    try:
+        for _ in range(args.games):
+            color = rng.choice(["white", "black"])
+            new_game = {"difficulty": args.difficulty, "player_color": color}
+            if args.time is not None:
+                new_game["time"] = args.time
+            while True:
+                start = time.monotonic()
+                reply = await client.request("new", **new_game)
+                if reply.get("error") != "busy":
+                    break
+                results["busy"] += 1
+                await asyncio.sleep(BUSY_RETRY_DELAY)
+            if "error" in reply:
+                raise RuntimeError(reply["message"])
+            if "ai_move" in reply:
+                results["latencies"].append(time.monotonic() - start)
+            game = reply["game"]
+            board = chess.Board(reply["fen"])
+
+            for _ in range(args.plies):
+                if board.is_game_over(claim_draw=True):
+                    break
+                move = rng.choice(list(board.legal_moves)).uci()
+                start = time.monotonic()
+                reply = await client.request("move", game=game, move=move)
+                if reply.get("error") == "busy":
+                    results["busy"] += 1
+                    await asyncio.sleep(BUSY_RETRY_DELAY)
+                    continue #the move was taken back, pick one again
+                if "error" in reply:
+                    raise RuntimeError(reply["message"])
+                if "ai_move" in reply:
+                    results["latencies"].append(time.monotonic() - start)
+                board = chess.Board(reply["fen"])
+            await client.request("close", game=game)
+            results["games"] += 1
+    finally:
+        await client.close()
+
+async def run(args):
+    results = {"games": 0, "busy": 0, "latencies": []}
+    start = time.monotonic()
+    await asyncio.gather(*(play_games(number, args, results) for number in range(args.clients)))
+    elapsed = time.monotonic() - start
+
+    client = await Client.connect(args.host, args.port)
+    server_stats = await client.request("stats")
+    await client.close()
+    server_stats.pop("id", None)
+    return {
+        "clients": args.clients,
+        "games": results["games"],
+        "moves": len(results["latencies"]),
+        "busy_replies": results["busy"],
+        "seconds": round(elapsed, 2),
+        "moves_per_second": round(len(results["latencies"]) / elapsed, 2) if elapsed > 0 else 0,
+        "latency": percentiles(results["latencies"]), #as seen by the clients, round trip
+        "server": server_stats,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many concurrent random games against server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent connections")
+    parser.add_argument("--games", type=int, default=1, help="games per client, one after the other")
+    parser.add_argument("--plies", type=int, default=20, help="player moves per game at most")
+    parser.add_argument("--difficulty", type=int, default=2, help="AI level 1-5")
+    parser.add_argument("--time", type=float, help="time budget per AI move, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+from engine import Engine
+from hashfile import DEFAULT_HASH_FILE_BITS, DEFAULT_HASH_FILE_PATH, open_hash_file
+
+# Fills the search hash file with common positions, so the game answers them without searching.
+#   python prepopulate.py --depth 3                     start position and every first move
+#   python prepopulate.py --depth 4 --plies 8 --pgn openings.pgn --workers 4
+# The positions are the start position and everything within --plies of it, or the first
+# --plies of every game in the PGN file. Each one is searched to --depth and its result (and
+# the deeper results of the search tree) go to the file the game loads at startup.
+
+_prepopulate_engine = None
+
+def _init_prepopulate_worker(path):
+    global _prepopulate_engine
+    _prepopulate_engine = Engine()
+    _prepopulate_engine.hash_file_path = path #all workers write to the same mapped file
+
+def search_position(fen, depth):
+    engine = _prepopulate_engine
+    board = chess.Board(fen)
+    if engine.hash_file_root(board, depth) is not None:
+        return fen, 0 #already in the file at this depth
+    engine.search(board, depth)
+    return fen, engine.nodes
+
+def tree_positions(board, plies, positions):
+    positions[chess.polyglot.zobrist_hash(board)] = board.fen()
+    if plies == 0:
+        return
+    for move in board.legal_moves:
+        board.push(move)
+        if not board.is_game_over():
+            tree_positions(board, plies - 1, positions)
+        board.pop()
+
+def pgn_positions(path, plies, positions):
+    with open(path, encoding="utf-8", errors="replace") as pgn_file:
+        while True:
+            game = chess.pgn.read_game(pgn_file)
+            if game is None:
+                return
+            board = game.board()
+            positions[chess.polyglot.zobrist_hash(board)] = board.fen()
+            for move in list(game.mainline_moves())[:plies]:
+                board.push(move)
+                positions[chess.polyglot.zobrist_hash(board)] = board.fen()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-populate the search hash file with common positions")
+    parser.add_argument("--output", default=DEFAULT_HASH_FILE_PATH, help="hash file, created when missing")
+    parser.add_argument("--size-bits", type=int, default=DEFAULT_HASH_FILE_BITS, help="2^N buckets for a new file")
+    parser.add_argument("--depth", type=int, default=3, help="search depth per position (the game level it covers)")
+    parser.add_argument("--plies", type=int, default=1, help="positions up to this many plies from the start")
+    parser.add_argument("--pgn", help="take the positions from the games in this file instead")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="search processes")
+    args = parser.parse_args(argv)
+
+    positions = {}
+    if args.pgn:
+        pgn_positions(args.pgn, args.plies, positions)
+    else:
+        tree_positions(chess.Board(), args.plies, positions)
+    try:
+        hash_file = open_hash_file(args.output, Engine().hash_file_key(), args.size_bits) #created here, before the workers map it
+    except ValueError as error:
+        print(f"{error}, remove it to start a new one", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    searched = nodes = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_prepopulate_worker,
+                             initargs=(args.output,)) as pool:
+        for fen, position_nodes in pool.map(search_position, positions.values(), [args.depth] * len(positions)):
+            searched += 1
+            nodes += position_nodes
+            print(f"{searched}/{len(positions)} {fen}", file=sys.stderr)
+
+    hash_file.flush()
+    filled = sum(1 for _ in hash_file.entries())
+    print(f"{len(positions)} positions at depth {args.depth}, {nodes} nodes in {time.perf_counter() - start:.1f}s; "
+          f"{args.output} holds {filled} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
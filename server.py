@@ -0,0 +1,391 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+import chess
+
+from engine import Engine
+
+# Engine server for many games at once, instead of one Tk process per game. Clients talk
+# line-delimited JSON over TCP, one object per line; every reply echoes the request's "id".
+#   python server.py --port 8765 --workers 4
+#   {"id": 1, "cmd": "new", "difficulty": 3, "player_color": "white"}
+#   {"id": 2, "cmd": "move", "game": "g1", "move": "e2e4", "time": 1.0}
+#   {"id": 3, "cmd": "state", "game": "g1"}     {"id": 4, "cmd": "close", "game": "g1"}
+#   {"id": 5, "cmd": "stats"}
+# Games are light sessions in the server process; only the searches go to a bounded process
+# pool. Waiting searches are queued per connection and taken round-robin, so one busy client
+# can't starve the others. When the queue is full a move gets {"error": "busy"} right away.
+# A game lives as long as the connection that started it.
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 64 #searches waiting for a worker before new ones are turned away
+DEFAULT_MAX_TIME = 10.0 #cap on the time budget a request may ask for, seconds
+MIN_SEARCH_TIME = 0.05 #a request that used up its budget in the queue still gets this long
+LATENCY_SAMPLES = 1000 #recent searches the percentiles are computed from
+
+_server_engine = None #one engine per worker process, its table carries over between searches
+
+def _init_server_worker():
+    global _server_engine
+    _server_engine = Engine()
+
+def search_move(fen, moves, depth, time_limit):
+    # Runs in a worker process: the AI move of the game, replayed so repetitions are known
+    board = chess.Board(fen)
+    for uci in moves:
+        board.push_uci(uci)
+    start = time.perf_counter()
+    move = _server_engine.book_move(board)
+    if move is None:
+        _, move = _server_engine.search(board, depth, time_limit)
+    return move.uci(), _server_engine.nodes, time.perf_counter() - start
+
+class RequestError(Exception):
+    pass
+
+class Busy(RequestError):
+    pass
+
+class GameSession:
+    def __init__(self, game_id, client, difficulty, player_color, time_limit):
+        self.game_id = game_id
+        self.client = client #connection that started the game, its sessions end with it
+        self.board = chess.Board()
+        self.history = [] #SAN of every move
+        self.difficulty = difficulty #search depth, same levels as the Tk game
+        self.player_color = player_color #True = White, False = Black
+        self.time_limit = time_limit #seconds per AI move, None = search to full depth
+        self.searching = False
+
+    def push(self, move):
+        self.history.append(self.board.san(move))
+        self.board.push(move)
+
+    def pop(self):
+        self.history.pop()
+        return self.board.pop()
+
+    def state(self):
+        outcome = self.board.outcome(claim_draw=True)
+        return {
+            "game": self.game_id,
+            "fen": self.board.fen(),
+            "history": self.history,
+            "difficulty": self.difficulty,
+            "player_color": "white" if self.player_color else "black",
+            "turn": "white" if self.board.turn else "black",
+            "result": outcome.result() if outcome else None,
+        }
+
+class SearchScheduler:
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pool = self.new_pool()
+        self.queues = collections.OrderedDict() #client -> deque of waiting jobs, in round-robin order
+        self.queued = 0
+        self.in_flight = 0
+        self.work_available = asyncio.Event()
+        self.slots = asyncio.Semaphore(workers)
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0 #searches that spent their whole budget waiting
+        self.waits = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.dispatcher = None
+
+    def new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_server_worker)
+
+    def restart_pool(self, broken_pool):
+        # A worker died and took the pool with it: searches in it fail, later ones get a new pool
+        if self.pool is broken_pool:
+            broken_pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.new_pool()
+
+    def start(self):
+        self.dispatcher = asyncio.get_running_loop().create_task(self.dispatch())
+        self.dispatcher.add_done_callback(self.dispatcher_done)
+
+    def dispatcher_done(self, dispatcher):
+        # The dispatcher only ends when the server closes; anything else would leave every
+        # queued search waiting forever, so it is reported and started again
+        if dispatcher.cancelled():
+            return
+        print(f"search dispatcher failed: {dispatcher.exception()!r}, restarting", file=sys.stderr)
+        self.slots = asyncio.Semaphore(self.workers - self.in_flight)
+        self.start()
+
+    async def close(self):
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+        self.pool.shutdown(cancel_futures=True)
+
+    def submit(self, client, fen, moves, depth, time_limit):
+        # Future of (uci, nodes, search seconds); Busy when the queue is full (backpressure)
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Busy(f"{self.queued} searches waiting, try again later")
+        future = asyncio.get_running_loop().create_future()
+        deadline = time.monotonic() + time_limit if time_limit is not None else None
+        job = (future, fen, moves, depth, time_limit, deadline, time.monotonic())
+        self.queues.setdefault(client, collections.deque()).append(job)
+        self.queued += 1
+        self.work_available.set()
+        return future
+
+    def drop_client(self, client):
+        # Connection gone: its waiting searches are dropped, running ones finish unseen
+        for job in self.queues.pop(client, ()):
+            job[0].cancel()
+            self.queued -= 1
+
+    def next_job(self):
+        # Round-robin: the first client in line gives one job and goes to the back
+        client, jobs = next(iter(self.queues.items()))
+        job = jobs.popleft()
+        if jobs:
+            self.queues.move_to_end(client)
+        else:
+            del self.queues[client]
+        self.queued -= 1
+        return job
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.slots.acquire()
+            while not self.queues:
+                self.work_available.clear()
+                await self.work_available.wait()
+            future, fen, moves, depth, time_limit, deadline, queued_at = self.next_job()
+            if future.done(): #cancelled while waiting
+                self.slots.release()
+                continue
+            if deadline is not None:
+                # The time budget covers the wait in the queue too
+                remaining = deadline - time.monotonic()
+                if remaining < MIN_SEARCH_TIME:
+                    self.expired += 1
+                time_limit = max(MIN_SEARCH_TIME, remaining)
+            self.waits.append(time.monotonic() - queued_at)
+            pool = self.pool
+            try:
+                work = loop.run_in_executor(pool, search_move, fen, moves, depth, time_limit)
+            except Exception as error:
+                # The dispatcher keeps running whatever the pool does, the request gets the error
+                self.slots.release()
+                if isinstance(error, BrokenExecutor):
+                    self.restart_pool(pool)
+                if not future.done():
+                    future.set_exception(error)
+                continue
+            self.in_flight += 1
+            work.add_done_callback(lambda done, future=future, queued_at=queued_at, pool=pool: self.finished(done, future, queued_at, pool))
+
+    def finished(self, work, future, queued_at, pool):
+        self.in_flight -= 1
+        self.slots.release()
+        self.completed += 1
+        self.latencies.append(time.monotonic() - queued_at)
+        error = None if work.cancelled() else work.exception()
+        if isinstance(error, BrokenExecutor):
+            self.restart_pool(pool)
+        if future.done():
+            return
+        if work.cancelled():
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(work.result())
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queued,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "wait": percentiles(self.waits),
+            "latency": percentiles(self.latencies),
+        }
+
+def percentiles(samples):
+    # p50/p90/p99 in milliseconds of the recent samples
+    if not samples:
+        return {"p50": None, "p90": None, "p99": None}
+    ordered = sorted(samples)
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+    return {"p50": at(0.50), "p90": at(0.90), "p99": at(0.99)}
+
+class EngineServer:
+    def __init__(self, workers, max_queue, max_time):
+        self.scheduler = SearchScheduler(workers, max_queue)
+        self.max_time = max_time
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+        self.client_ids = itertools.count(1)
+
+    async def handle_client(self, reader, writer):
+        client = next(self.client_ids)
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def reply(message):
+            async with write_lock:
+                writer.write((json.dumps(message) + "\n").encode())
+                await writer.drain() #a client that doesn't read slows only its own connection
+
+        async def handle(line):
+            request_id = None
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise RequestError("expected a JSON object")
+                request_id = request.get("id")
+                response = await self.handle_request(client, request)
+            except Busy as error:
+                response = {"error": "busy", "message": str(error), "queue_depth": self.scheduler.queued}
+            except (RequestError, ValueError) as error:
+                response = {"error": "bad request", "message": str(error)}
+            except Exception as error:
+                response = {"error": "search failed", "message": repr(error)}
+            response["id"] = request_id
+            await reply(response)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    # Every request runs on its own, so one game's search doesn't hold up the others
+                    task = asyncio.create_task(handle(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            self.scheduler.drop_client(client)
+            for task in tasks:
+                task.cancel()
+            # Nobody can reach these games any more
+            for game_id in [game_id for game_id, session in self.sessions.items() if session.client == client]:
+                del self.sessions[game_id]
+            writer.close()
+
+    def session(self, request):
+        session = self.sessions.get(request.get("game"))
+        if session is None:
+            raise RequestError(f"unknown game {request.get('game')!r}")
+        return session
+
+    def time_budget(self, request, session):
+        seconds = request.get("time", session.time_limit)
+        if seconds is None:
+            return None
+        return min(float(seconds), self.max_time)
+
+    async def handle_request(self, client, request):
+        command = request.get("cmd")
+        if command == "new":
+            difficulty = int(request.get("difficulty", 3))
+            if not 1 <= difficulty <= 5:
+                raise RequestError("difficulty goes from 1 to 5")
+            color = request.get("player_color", "white")
+            if color not in ("white", "black"):
+                raise RequestError("player_color is white or black")
+            time_limit = request.get("time")
+            session = GameSession(f"g{next(self.game_ids)}", client, difficulty, color == "white",
+                                  min(float(time_limit), self.max_time) if time_limit is not None else None)
+            self.sessions[session.game_id] = session
+            response = {}
+            if not session.player_color:
+                try:
+                    response = await self.ai_move(client, session, self.time_budget(request, session))
+                except BaseException: #busy, failed or cancelled: the game never started, the client asks again
+                    self.sessions.pop(session.game_id, None)
+                    raise
+            return {**session.state(), **response}
+
+        if command == "move":
+            session = self.session(request)
+            if session.searching:
+                raise RequestError("the AI is still thinking")
+            if session.board.turn != session.player_color or session.board.is_game_over(claim_draw=True):
+                raise RequestError("not the player's turn")
+            try:
+                move = session.board.parse_uci(str(request.get("move")))
+            except ValueError:
+                raise RequestError(f"illegal move {request.get('move')!r}")
+            session.push(move)
+            response = {}
+            if not session.board.is_game_over(claim_draw=True):
+                try:
+                    response = await self.ai_move(client, session, self.time_budget(request, session))
+                except BaseException:
+                    # Busy, a failed search or a cancelled request: the move is taken back, so the
+                    # player is to move again and can send it once more
+                    session.pop()
+                    raise
+            return {**session.state(), **response}
+
+        if command == "state":
+            return self.session(request).state()
+        if command == "close":
+            self.sessions.pop(self.session(request).game_id)
+            return {"closed": request["game"]}
+        if command == "stats":
+            return {**self.scheduler.stats(), "sessions": len(self.sessions)}
+        raise RequestError(f"unknown command {command!r}")
+
+    async def ai_move(self, client, session, time_limit):
+        root = session.board.root()
+        moves = [move.uci() for move in session.board.move_stack]
+        session.searching = True
+        try:
+            uci, nodes, seconds = await self.scheduler.submit(client, root.fen(), moves, session.difficulty, time_limit)
+        finally:
+            session.searching = False
+        session.push(chess.Move.from_uci(uci))
+        return {"ai_move": uci, "nodes": nodes, "search_time": round(seconds, 3)}
+
+async def serve(host, port, workers, max_queue, max_time):
+    server = EngineServer(workers, max_queue, max_time)
+    server.scheduler.start()
+    tcp_server = await asyncio.start_server(server.handle_client, host, port)
+    print(f"Engine server on {host}:{port} with {workers} workers", file=sys.stderr)
+    try:
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        await server.scheduler.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve engine moves for many games over line-JSON TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="search processes")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE, help="waiting searches before requests are turned away")
+    parser.add_argument("--max-time", type=float, default=DEFAULT_MAX_TIME, help="largest time budget per move, seconds")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, max(1, args.workers), args.max_queue, args.max_time))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
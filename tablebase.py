@@ -0,0 +1,25 @@
+import chess.syzygy
+
+# Syzygy endgame tablebases from a local directory. The handle of a directory is opened once
+# and kept for the life of the process; python-chess opens the table files lazily on the first
+# probe and keeps them open too. Worker processes of the parallel search get their own handles.
+
+DEFAULT_TABLEBASE_PATH = "syzygy"
+DEFAULT_TB_PIECES = 5 #only positions with at most this many pieces (kings included) are probed
+TB_WIN = 9000 #score of a tablebase win, below the mate scores so a real mate is still preferred
+
+_tablebases = {} #directory -> open chess.syzygy.Tablebase
+_max_pieces = {} #directory -> largest piece count it has tables for
+
+def open_tablebase(path):
+    tablebase = _tablebases.get(path)
+    if tablebase is None:
+        tablebase = _tablebases[path] = chess.syzygy.open_tablebase(path)
+    return tablebase
+
+def max_pieces(path):
+    # Largest piece count the directory has WDL tables for, e.g. 5 for KRPvKR
+    pieces = _max_pieces.get(path)
+    if pieces is None:
+        pieces = _max_pieces[path] = max((len(name) - 1 for name in open_tablebase(path).wdl), default=0)
+    return pieces
@@ -0,0 +1,269 @@
+import argparse
+import io
+import json
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chess
+import chess.pgn
+
+from engine import Engine
+
+# Headless self-play between two engine configurations, for checking evaluation and search
+# changes without the Tk game. Needs no display, so it runs unattended on a CI box.
+#   python tournament.py --games 40 --openings openings.epd \
+#       --engine1 "name=base,depth=3" --engine2 "name=tuned,depth=3,tables=tuned.json"
+# Every opening is played twice with colors swapped. Games go to a PGN file, the summary
+# (W/D/L from engine1's side, Elo difference with a 95% error bar, nps) to stdout and JSON.
+
+DEFAULT_MAX_PLIES = 300 #games still running after this many plies are adjudicated a draw
+
+# Engine attributes a configuration may set, with the type of the value
+ENGINE_OPTIONS = {
+    "quiescence": ("use_quiescence", bool),
+    "qdepth": ("max_qdepth", int),
+    "ordering": ("use_move_ordering", bool),
+    "pvs": ("use_pvs", bool),
+    "nullmove": ("use_null_move", bool),
+    "lmr": ("use_lmr", bool),
+}
+
+def parse_config(text, default_name):
+    # "name=tuned,depth=3,time=0.5,nodes=20000,tables=tuned.json,quiescence=false"
+    config = {"name": default_name, "depth": 3, "time": None, "nodes": None, "tables": None, "options": {}}
+    for part in filter(None, text.split(",")):
+        key, _, value = part.partition("=")
+        key = key.strip().lower()
+        value = value.strip()
+        if key in ("name", "tables"):
+            config[key] = value
+        elif key == "depth":
+            config["depth"] = int(value)
+        elif key == "time":
+            config["time"] = float(value)
+        elif key == "nodes":
+            config["nodes"] = int(value)
+        elif key in ENGINE_OPTIONS:
+            attribute, kind = ENGINE_OPTIONS[key]
+            config["options"][attribute] = value.lower() in ("1", "true", "yes", "on") if kind is bool else kind(value)
+        else:
+            raise ValueError(f"unknown engine setting {key!r}")
+    if config["tables"]:
+        config["tables_data"] = load_tables(config["tables"])
+    return config
+
+def load_tables(path):
+    # {"piece_values": {"pawn": 100, ...}, "piece_tables": {"knight": [64 numbers], ...}};
+    # pieces that are left out keep the engine's values
+    with open(path) as tables_file:
+        data = json.load(tables_file)
+    tables = {"piece_values": {}, "piece_tables": {}}
+    for section in tables:
+        for name, value in data.get(section, {}).items():
+            piece_type = chess.PIECE_NAMES.index(name.lower())
+            if section == "piece_tables" and len(value) != 64:
+                raise ValueError(f"{path}: piece_tables.{name} needs 64 entries")
+            tables[section][piece_type] = value
+    return tables
+
+def make_engine(config):
+    engine = Engine()
+    engine.__dict__.update(config["options"])
+    tables = config.get("tables_data")
+    if tables:
+        # Instance copies, so the class tables of other engines stay untouched
+        engine.piece_values = {**Engine.piece_values, **tables["piece_values"]}
+        engine.piece_tables = {**Engine.piece_tables, **tables["piece_tables"]}
+        engine.square_scores = engine.build_square_scores()
+        engine.king_endgame_scores = engine.build_king_endgame_scores()
+    return engine
+
+def load_openings(path):
+    # Start positions as (fen, moves): EPD or FEN lines give a position, PGN games their moves
+    if path is None:
+        return [(chess.STARTING_FEN, [])]
+    openings = []
+    if path.lower().endswith(".pgn"):
+        with open(path, encoding="utf-8", errors="replace") as pgn_file:
+            while True:
+                game = chess.pgn.read_game(pgn_file)
+                if game is None:
+                    break
+                openings.append((game.board().fen(), [move.uci() for move in game.mainline_moves()]))
+    else:
+        with open(path) as epd_file:
+            for line_number, line in enumerate(epd_file, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    board, _ = chess.Board.from_epd(line)
+                except ValueError:
+                    try:
+                        board = chess.Board(line) #plain FEN with move counters
+                    except ValueError as error:
+                        print(f"{path}:{line_number}: skipped ({error})", file=sys.stderr)
+                        continue
+                openings.append((board.fen(), []))
+    if not openings:
+        raise ValueError(f"no openings in {path}")
+    return openings
+
+def play_game(round_number, fen, opening_moves, white_config, black_config, max_plies):
+    # Runs in a worker process. Each side keeps its own engine (and table) for the whole game.
+    engines = {chess.WHITE: make_engine(white_config), chess.BLACK: make_engine(black_config)}
+    configs = {chess.WHITE: white_config, chess.BLACK: black_config}
+    nodes = {chess.WHITE: 0, chess.BLACK: 0}
+    seconds = {chess.WHITE: 0.0, chess.BLACK: 0.0}
+
+    board = chess.Board(fen)
+    for uci in opening_moves:
+        board.push_uci(uci)
+    opening_plies = len(board.move_stack)
+
+    while not board.is_game_over(claim_draw=True) and len(board.move_stack) - opening_plies < max_plies:
+        side = board.turn
+        config = configs[side]
+        start = time.perf_counter()
+        _, move = engines[side].search(board, config["depth"], config["time"], config["nodes"])
+        seconds[side] += time.perf_counter() - start
+        nodes[side] += engines[side].nodes
+        board.push(move)
+
+    outcome = board.outcome(claim_draw=True)
+    result = outcome.result() if outcome else "1/2-1/2"
+    termination = outcome.termination.name.lower() if outcome else "adjudicated draw (ply limit)"
+
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "Self-play tournament"
+    game.headers["Round"] = str(round_number)
+    game.headers["White"] = white_config["name"]
+    game.headers["Black"] = black_config["name"]
+    game.headers["Result"] = result
+    game.headers["Termination"] = termination
+    pgn = io.StringIO()
+    print(game, file=pgn, end="\n\n")
+
+    return {
+        "round": round_number,
+        "white": white_config["name"],
+        "black": black_config["name"],
+        "result": result,
+        "plies": len(board.move_stack) - opening_plies,
+        "nodes": {"white": nodes[chess.WHITE], "black": nodes[chess.BLACK]},
+        "time": {"white": seconds[chess.WHITE], "black": seconds[chess.BLACK]},
+        "pgn": pgn.getvalue(),
+    }
+
+def elo_difference(score):
+    if score <= 0.0:
+        return -math.inf
+    if score >= 1.0:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+def summarize(results, config1, config2):
+    # Everything from engine1's point of view
+    wins = draws = losses = 0
+    nodes = {config1["name"]: 0, config2["name"]: 0}
+    seconds = {config1["name"]: 0.0, config2["name"]: 0.0}
+    for game in results:
+        engine1_white = game["white"] == config1["name"]
+        if game["result"] == "1/2-1/2":
+            draws += 1
+        elif (game["result"] == "1-0") == engine1_white:
+            wins += 1
+        else:
+            losses += 1
+        for color in ("white", "black"):
+            nodes[game[color]] += game["nodes"][color]
+            seconds[game[color]] += game["time"][color]
+
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games if games else 0.5
+    # 95% interval of the score from the per-game variance, turned into Elo
+    variance = ((wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games) if games else 0.0
+    margin = 1.96 * math.sqrt(variance / games) if games else 0.0
+    elo = elo_difference(score)
+    elo_error = (elo_difference(score + margin) - elo_difference(score - margin)) / 2
+
+    def rounded(value):
+        return round(value, 1) if math.isfinite(value) else None #JSON has no infinity
+
+    return {
+        "engine1": config1["name"],
+        "engine2": config2["name"],
+        "games": games,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "score": round(score, 4),
+        "elo": rounded(elo),
+        "elo_error": rounded(elo_error),
+        "nps": {name: int(nodes[name] / seconds[name]) if seconds[name] > 0 else 0 for name in nodes},
+    }
+
+def format_summary(summary):
+    elo = "inf" if summary["elo"] is None else f"{summary['elo']:+.1f}"
+    error = "inf" if summary["elo_error"] is None else f"{summary['elo_error']:.1f}"
+    nps = ", ".join(f"{name} {value} nps" for name, value in summary["nps"].items())
+    return (
+        f"{summary['engine1']} vs {summary['engine2']}: {summary['games']} games, "
+        f"+{summary['wins']} ={summary['draws']} -{summary['losses']} (score {summary['score']:.1%})\n"
+        f"Elo difference {elo} +/- {error} (95%)\n"
+        f"Average speed: {nps}"
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play two engine configurations against each other")
+    parser.add_argument("--engine1", default="", help="e.g. name=base,depth=3,time=0.5,tables=file.json")
+    parser.add_argument("--engine2", default="", help="same settings as --engine1")
+    parser.add_argument("--games", type=int, default=20, help="number of games, rounded up to an even number")
+    parser.add_argument("--openings", help="EPD or PGN file with start positions (default: the initial position)")
+    parser.add_argument("--concurrency", type=int, default=1, help="games played at the same time, one process each")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="adjudicate a draw after this many plies")
+    parser.add_argument("--pgn", default="tournament.pgn", help="PGN file for the games")
+    parser.add_argument("--summary", help="also write the summary as JSON here")
+    args = parser.parse_args(argv)
+
+    config1 = parse_config(args.engine1, "engine1")
+    config2 = parse_config(args.engine2, "engine2")
+    if config1["name"] == config2["name"]:
+        config2["name"] += "-2"
+    openings = load_openings(args.openings)
+
+    # Game pairs on the same opening with colors swapped, cycling through the openings
+    games = []
+    for pair in range((args.games + 1) // 2):
+        fen, moves = openings[pair % len(openings)]
+        games.append((fen, moves, config1, config2))
+        games.append((fen, moves, config2, config1))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = [
+            pool.submit(play_game, round_number, fen, moves, white, black, args.max_plies)
+            for round_number, (fen, moves, white, black) in enumerate(games, 1)
+        ]
+        for future in as_completed(futures):
+            game = future.result()
+            results.append(game)
+            print(f"Round {game['round']}: {game['white']} - {game['black']} {game['result']}", file=sys.stderr)
+
+    results.sort(key=lambda game: game["round"])
+    with open(args.pgn, "w") as pgn_file:
+        for game in results:
+            pgn_file.write(game["pgn"])
+
+    summary = summarize(results, config1, config2)
+    print(format_summary(summary))
+    if args.summary:
+        with open(args.summary, "w") as summary_file:
+            json.dump(summary, summary_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import os
+import sys
+import threading
+
+import chess
+
+from book import DEFAULT_BOOK_PATH, DEFAULT_BOOK_PLY, OpeningBook
+from engine import Engine, SearchHandle
+from tablebase import DEFAULT_TB_PIECES
+
+# UCI front end for the engine, so it can be driven by chess GUIs and tournament managers
+# without a display:  python uci.py  and then talk UCI on stdin/stdout.
+
+ENGINE_NAME = "Chess vs AI"
+ENGINE_AUTHOR = "Chess vs AI contributors"
+
+DEFAULT_DEPTH = 5 #plain "go" without limits searches like the hardest GUI level
+MAX_DEPTH = 64 #depth cap when the search is only limited by time, nodes or "stop"
+MOVE_OVERHEAD = 0.05 #seconds kept back for communication lag
+DEFAULT_MOVES_TO_GO = 30 #moves left to plan for when the GUI doesn't say
+
+class UciEngine:
+    def __init__(self, output=sys.stdout):
+        self.engine = Engine()
+        self.board = chess.Board()
+        self.output = output
+        self.output_lock = threading.Lock() #info lines come from the search thread
+        self.search_handle = None
+        self.stop_requested = threading.Event() #"stop" received, ends the wait of "go infinite"
+        self.search_stop = None #stop_request of the running search, set by "stop"
+        self.own_book = False #"OwnBook" option, the GUI usually brings its own book
+        self.book_path = DEFAULT_BOOK_PATH
+        self.book_ply = DEFAULT_BOOK_PLY
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, lines=sys.stdin):
+        for line in lines:
+            if not self.handle(line.strip()):
+                break
+        self.stop_search()
+        self.engine.shutdown_search_pool()
+        self.close_book()
+
+    def handle(self, line):
+        # Returns False when the engine should quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Threads type spin default 1 min 1 max {os.cpu_count() or 1}")
+            self.send("option name Ponder type check default false") #GUIs only send "go ponder" when this exists
+            self.send("option name OwnBook type check default false")
+            self.send(f"option name BookFile type string default {DEFAULT_BOOK_PATH}")
+            self.send(f"option name BookDepth type spin default {DEFAULT_BOOK_PLY} min 0 max 200")
+            self.send("option name SyzygyPath type string default <empty>")
+            self.send(f"option name SyzygyProbeLimit type spin default {DEFAULT_TB_PIECES} min 0 max 7")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.engine.tt.clear()
+            self.board = chess.Board()
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.stop_search()
+            self.set_position(args)
+        elif command == "go":
+            self.stop_search()
+            self.go(args)
+        elif command == "ponderhit":
+            # The expected move was played, the ponder search now runs on our clock
+            self.engine.ponderhit()
+            self.stop_requested.set()
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            return False
+        # Unknown commands are ignored, as the protocol asks
+        return True
+
+    def set_option(self, args):
+        # setoption name <id> [value <x>]
+        if "name" not in args:
+            return
+        value_at = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_at]).lower()
+        value = " ".join(args[value_at + 1:])
+
+        if name == "threads":
+            try:
+                self.engine.workers = max(1, int(value))
+            except ValueError:
+                pass
+        elif name == "ownbook":
+            self.own_book = value.lower() == "true"
+            self.open_book()
+        elif name == "bookfile":
+            self.book_path = value
+            self.open_book()
+        elif name == "syzygypath":
+            if value in ("", "<empty>"):
+                self.engine.tablebase_path = None
+            elif os.path.isdir(value):
+                self.engine.tablebase_path = value
+            else:
+                self.send(f"info string no tablebase directory {value}")
+        elif name == "syzygyprobelimit":
+            try:
+                self.engine.tb_max_pieces = max(0, int(value))
+            except ValueError:
+                pass
+        elif name == "ponder":
+            pass #nothing to set up, the GUI decides when to send "go ponder"
+        elif name == "bookdepth":
+            try:
+                self.book_ply = max(0, int(value))
+            except ValueError:
+                pass
+            if self.engine.book is not None:
+                self.engine.book.max_ply = self.book_ply
+
+    def open_book(self):
+        # (Re)opens the book after OwnBook or BookFile changed
+        self.close_book()
+        if not self.own_book:
+            return
+        try:
+            self.engine.book = OpeningBook(self.book_path, self.book_ply)
+        except OSError as error:
+            self.send(f"info string cannot open book: {error}")
+
+    def close_book(self):
+        if self.engine.book is not None:
+            self.engine.book.close()
+            self.engine.book = None
+
+    def set_position(self, args):
+        # position [startpos | fen <fen>] [moves <move1> ... <movei>]
+        moves_at = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args and args[0] == "fen":
+                board = chess.Board(" ".join(args[1:moves_at]))
+            else:
+                board = chess.Board()
+            for uci in args[moves_at + 1:]:
+                board.push_uci(uci)
+        except ValueError as error:
+            self.send(f"info string invalid position: {error}")
+            return
+        self.board = board
+
+    def parse_go(self, args):
+        params = {}
+        i = 0
+        while i < len(args):
+            token = args[i]
+            if token in ("infinite", "ponder"):
+                params[token] = True
+                i += 1
+            elif token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes"):
+                try:
+                    params[token] = int(args[i + 1])
+                except (IndexError, ValueError):
+                    pass
+                i += 2
+            else:
+                i += 1
+        return params
+
+    def time_budget(self, params):
+        # Seconds to spend on this move, None = no time limit
+        if "movetime" in params:
+            return max(params["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+
+        remaining = params.get("wtime" if self.board.turn == chess.WHITE else "btime")
+        if remaining is None:
+            return None
+        increment = params.get("winc" if self.board.turn == chess.WHITE else "binc", 0)
+        moves_to_go = params.get("movestogo") or DEFAULT_MOVES_TO_GO
+        budget = remaining / moves_to_go + increment * 0.75
+        # Never plan to use more than half of the clock on one move
+        budget = min(budget, remaining / 2) / 1000 - MOVE_OVERHEAD
+        return max(budget, 0.01)
+
+    def go(self, args):
+        params = self.parse_go(args)
+        infinite = params.get("infinite", False)
+        ponder = params.get("ponder", False)
+
+        # Book moves are answered at once, except in analysis ("go infinite") and pondering
+        book_move = None if infinite or ponder else self.engine.book_move(self.board)
+        if book_move:
+            self.send(f"info string book move {book_move.uci()}")
+            self.send(f"bestmove {book_move.uci()}")
+            return
+        time_limit = None if infinite else self.time_budget(params)
+        node_limit = None if infinite else params.get("nodes")
+
+        if "depth" in params and not infinite:
+            max_depth = max(1, params["depth"])
+        elif infinite or time_limit is not None or node_limit is not None:
+            max_depth = MAX_DEPTH
+        else:
+            max_depth = DEFAULT_DEPTH
+
+        board = self.board.copy()
+        white_to_move = board.turn == chess.WHITE
+
+        def send_info(info):
+            score = info["score"] if white_to_move else -info["score"] #UCI scores are for the side to move
+            pv = " ".join(move.uci() for move in info["pv"])
+            self.send(
+                f"info depth {info['depth']} score cp {int(score)} nodes {info['nodes']} "
+                f"nps {info['nps']} time {int(info['time'] * 1000)} pv {pv}"
+            )
+
+        search_stop = threading.Event() #new for every search, so "stop" right after "go" still reaches it
+
+        def search(board, stop_event):
+            _, best_move = self.engine.search(board, max_depth, time_limit, node_limit, stop_event, send_info, search_stop)
+            # In infinite and ponder mode the answer waits for "stop" (or "ponderhit"),
+            # even if the search ends by itself
+            if infinite or ponder:
+                self.stop_requested.wait()
+            if best_move is None:
+                self.send("bestmove 0000")
+                return best_move
+            ponder_move = self.ponder_move(board, best_move)
+            self.send(f"bestmove {best_move.uci()}" + (f" ponder {ponder_move.uci()}" if ponder_move else ""))
+            return best_move
+
+        self.stop_requested.clear()
+        self.search_stop = search_stop
+        if ponder:
+            self.engine.start_pondering(time_limit)
+        self.search_handle = SearchHandle(search, board)
+
+    def ponder_move(self, board, best_move):
+        # The reply the principal variation expects, for the GUI to ponder on; None if unknown
+        pv = self.engine.principal_variation
+        if len(pv) < 2 or pv[0] != best_move:
+            return None
+        after = board.copy(stack=False)
+        after.push(best_move)
+        return pv[1] if after.is_legal(pv[1]) else None
+
+    def stop_search(self):
+        # Ends the running search early, it still answers with its best move
+        if self.search_handle is not None:
+            self.stop_requested.set()
+            self.search_stop.set()
+            self.search_handle.wait()
+            try:
+                self.search_handle.result()
+            except Exception as error:
+                self.send(f"info string search failed: {error}")
+            self.search_handle = None
+
+
+if __name__ == "__main__":
+    UciEngine().run()